@@ -0,0 +1,47 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+def classify_cells(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Classify every cell of a sheet at once.
+    Returns (mask, text): mask is True for translatable cells, text holds the stripped source strings.
+    Empty cells and numeric-only strings (digits with '.' or '-') are not translatable; columns that
+    pandas already parsed as numbers, booleans or dates are skipped without looking at their cells.
+    """
+    mask = pd.DataFrame(False, index=df.index, columns=df.columns)
+    text = pd.DataFrame("", index=df.index, columns=df.columns)
+
+    text_columns = [
+        col for col in df.columns
+        if not (is_numeric_dtype(df[col]) or is_bool_dtype(df[col]) or is_datetime64_any_dtype(df[col]))
+    ]
+    for col in text_columns:
+        stripped = df[col].astype(str).str.strip()
+        numeric = stripped.str.replace('.', '', regex=False).str.replace('-', '', regex=False).str.isdigit()
+        mask[col] = df[col].notna() & (stripped != "") & ~numeric
+        text[col] = stripped
+    return mask, text
+
+def unique_sources(mask: pd.DataFrame, text: pd.DataFrame) -> List[str]:
+    """Unique translatable strings of a sheet, in first-seen column order"""
+    columns = mask.columns[mask.any()]
+    if len(columns) == 0:
+        return []
+    return list(pd.unique(np.concatenate([text[col][mask[col]].to_numpy() for col in columns])))
+
+def first_rows(mask: pd.DataFrame, text: pd.DataFrame) -> Dict[str, object]:
+    """Index of the first row holding each unique translatable string, e.g. to attribute its translation call"""
+    stacked = text.stack()[mask.stack()]
+    stacked = stacked[~stacked.duplicated()]
+    return dict(zip(stacked.to_numpy(), stacked.index.get_level_values(0)))
+
+def scatter_translations(df: pd.DataFrame, mask: pd.DataFrame, text: pd.DataFrame, translations: Dict[str, str]) -> pd.DataFrame:
+    """Write translations back into a copy of the sheet, one bulk assignment per column with translatable cells"""
+    df_out = df.copy()
+    for col in mask.columns[mask.any()]:
+        rows = mask[col]
+        df_out.loc[rows, col] = text[col][rows].map(translations)
+    return df_out
@@ -1,8 +1,14 @@
 import pandas as pd
+import numpy as np
 from anthropic import Anthropic
 import time
-import requests
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from usage_ledger import UsageLedger
+from text_protection import PROTECTED_PATTERN
+from ollama_client import get_client, make_output_validator
 
 # Replace this with your actual Anthropic API key
 ANTHROPIC_API_KEY = ""
@@ -10,6 +16,50 @@ ANTHROPIC_API_KEY = ""
 # Initialize Anthropic client
 client = Anthropic(api_key=ANTHROPIC_API_KEY)
 
+# Token usage of both backends, persisted across runs
+ledger = UsageLedger(label='dual_translation')
+get_client().ledger = ledger
+
+# Per-backend limits: requests started per second, requests in flight, and the persistent memory file
+BACKENDS = {
+    'claude': {'requests_per_second': 0.8, 'in_flight': 4, 'memory_file': 'claude_memory.json'},
+    'ollama': {'requests_per_second': 10.0, 'in_flight': get_client().num_parallel, 'memory_file': 'ollama_memory.json'},
+}
+
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        """
+        Space out request starts to at most requests_per_second, shared by all threads of a backend
+        """
+        self.interval = 1.0 / requests_per_second
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until the caller may start its request"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def load_memory(memory_file):
+    """
+    Load a backend's translation memory from previous runs
+    """
+    if os.path.exists(memory_file):
+        with open(memory_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_memory(memory, memory_file):
+    """
+    Persist a backend's translation memory for the next run
+    """
+    with open(memory_file, 'w', encoding='utf-8') as f:
+        json.dump(memory, f, ensure_ascii=False, indent=2)
+
 def post_process_newlines(text):
     """
     Replace actual newlines with \n string
@@ -24,9 +74,6 @@ def translate_with_ollama(text):
     Translate text using Ollama's llama2 3B model
     """
     try:
-        # Ollama API endpoint (default local installation)
-        url = "http://localhost:11434/api/generate"
-        
         # Prepare the prompt
         prompt = f"""Localize following text to Thai. 
 Rules:
@@ -38,16 +85,9 @@ Rules:
 
 Text to Localize: {text}"""
 
-        # Prepare the request payload
-        payload = {
-            "model": "llama2:3b",
-            "prompt": prompt,
-            "stream": False
-        }
-
-        # Make the request
-        response = requests.post(url, json=payload)
-        response_json = response.json()
+        # Stream through the shared pooled client, aborting early on Chinese residue, explanations or runaway output
+        model = "llama2:3b"
+        response_json = get_client().generate_validated(model, prompt, make_output_validator(text))
         
         # Extract the translation
         translated_text = response_json.get('response', '').strip()
@@ -85,6 +125,7 @@ Text to Localize: {text}"""
             temperature=0.5
         )
         
+        ledger.record_anthropic(response)
         translated_text = response.content[0].text
         # Apply post-processing to handle any newlines
         processed_text = post_process_newlines(translated_text)
@@ -94,67 +135,156 @@ Text to Localize: {text}"""
         print(f"Error translating with Claude: {str(e)}")
         return None
 
+def _char_ngram_counts(texts, n):
+    """
+    Count the character n-grams of every text at once on one concatenated code point array.
+    Returns (rows, keys, counts) for each distinct (row, n-gram) plus the number of n-grams per row.
+    """
+    lengths = texts.str.len().to_numpy()
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    positions = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    
+    # Polynomial hash of the n characters starting at each position; n-grams must not cross texts
+    valid = np.flatnonzero(positions + n <= lengths[rows])
+    hashes = np.zeros(len(valid), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for offset in range(n):
+            hashes = hashes * np.uint64(1000003) + codes[valid + offset]
+        keys = hashes ^ (rows[valid].astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15))
+    
+    unique_keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    totals = np.bincount(rows[valid], minlength=len(texts))
+    return unique_keys, rows[valid][first], counts, totals
+
+def chrf_agreement(left, right, max_order=6, beta=1.0):
+    """
+    Character n-gram F-score (chrF, whitespace ignored) between two aligned Series of texts, computed
+    for all rows at once with array operations. beta=1 keeps the score symmetric, since neither side
+    is the reference.
+    """
+    left = left.fillna('').astype(str).str.replace(r'\s+', '', regex=True)
+    right = right.fillna('').astype(str).str.replace(r'\s+', '', regex=True)
+    precision = np.zeros(len(left))
+    recall = np.zeros(len(left))
+    orders = np.zeros(len(left))
+    
+    for n in range(1, max_order + 1):
+        left_keys, left_rows, left_counts, left_total = _char_ngram_counts(left, n)
+        right_keys, _, right_counts, right_total = _char_ngram_counts(right, n)
+        _, left_index, right_index = np.intersect1d(left_keys, right_keys, assume_unique=True, return_indices=True)
+        matches = np.bincount(left_rows[left_index],
+                              weights=np.minimum(left_counts[left_index], right_counts[right_index]),
+                              minlength=len(left))
+        
+        # Average only over orders both texts are long enough for
+        valid = (left_total > 0) & (right_total > 0)
+        precision += np.where(valid, matches / np.maximum(right_total, 1), 0)
+        recall += np.where(valid, matches / np.maximum(left_total, 1), 0)
+        orders += valid
+    
+    precision = precision / np.maximum(orders, 1)
+    recall = recall / np.maximum(orders, 1)
+    denominator = beta**2 * precision + recall
+    score = np.where(denominator > 0, (1 + beta**2) * precision * recall / np.where(denominator > 0, denominator, 1), 0)
+    return pd.Series(score, index=left.index)
+
+def score_agreement(source, claude_text, ollama_text, threshold=0.4):
+    """
+    Score agreement between both backends for a whole sheet.
+    Returns a frame with the chrF agreement, whether each output keeps the source's tags and
+    placeholders, and a needs_review flag for low agreement, missing output or broken tags.
+    """
+    def _tags(texts):
+        # Outputs had real newlines turned into literal \n by post_process_newlines; do the same to every side
+        texts = texts.fillna('').astype(str).str.replace('\n', '\\n', regex=False).str.replace('\r', '\\n', regex=False)
+        return texts.str.findall(PROTECTED_PATTERN).map(sorted).str.join('\x1f')
+    
+    source_tags = _tags(source)
+    scores = pd.DataFrame({
+        'agreement': chrf_agreement(claude_text, ollama_text).round(3),
+        'claude_tags_ok': _tags(claude_text) == source_tags,
+        'ollama_tags_ok': _tags(ollama_text) == source_tags,
+    }, index=source.index)
+    missing = claude_text.isna() | ollama_text.isna()
+    scores['needs_review'] = missing | (scores['agreement'] < threshold) | ~scores['claude_tags_ok'] | ~scores['ollama_tags_ok']
+    return scores
+
 def process_excel(input_file, output_file):
     """
-    Process Excel file and translate content from column C to columns D (Claude) and E (Ollama)
+    Process Excel file and translate content from column C to columns D (Claude) and E (Ollama).
+    Both backends run concurrently, each within its own rate limit and in-flight window.
     """
     try:
         # Read Excel file
         df = pd.read_excel(input_file)
+        sheet = os.path.basename(input_file)
+        
+        # Unique source texts from column C, with the first row each appears in
+        source = df.iloc[:, 2].astype(str)  # Column C is index 2
+        source = source[df.iloc[:, 2].notna() & (source.str.strip() != '')]
+        first_rows = source.drop_duplicates()
+        print(f"Found {len(first_rows)} unique texts in {len(source)} rows")
+        
+        translators = {'claude': translate_with_claude, 'ollama': translate_with_ollama}
+        memories = {name: load_memory(config['memory_file']) for name, config in BACKENDS.items()}
+        executors = {name: ThreadPoolExecutor(max_workers=config['in_flight']) for name, config in BACKENDS.items()}
+        limiters = {name: RateLimiter(config['requests_per_second']) for name, config in BACKENDS.items()}
+        
+        def _translate(name, row, text):
+            limiters[name].wait()
+            ledger.set_context(sheet=sheet, row=row)
+            return translators[name](text)
         
-        # Create translation memory dictionaries for both models
-        claude_memory = {}
-        ollama_memory = {}
-        
-        # Process each row
-        total_rows = len(df)
-        for index in range(total_rows):
-            try:
-                # Get source text from column C
-                source_text = str(df.iloc[index, 2])  # Column C is index 2
-                
-                # Skip empty cells
-                if pd.isna(source_text) or source_text.strip() == '':
+        # Submit every text missing from a backend's memory to that backend; both drain in parallel
+        futures = {}
+        for name in BACKENDS:
+            for row, text in first_rows.items():
+                if text not in memories[name]:
+                    futures[executors[name].submit(_translate, name, row, text)] = (name, text)
+        print(f"Sending {len(futures)} requests ({len(first_rows) * len(BACKENDS) - len(futures)} served from memory)")
+        
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                name, text = futures[future]
+                try:
+                    translation = future.result()
+                except Exception as e:
+                    print(f"Error translating with {name}: {str(e)}")
                     continue
-                
-                # Process with Claude
-                if source_text in claude_memory:
-                    claude_text = claude_memory[source_text]
-                else:
-                    claude_text = translate_with_claude(source_text)
-                    if claude_text:
-                        claude_memory[source_text] = claude_text
-                
-                # Process with Ollama
-                if source_text in ollama_memory:
-                    ollama_text = ollama_memory[source_text]
-                else:
-                    ollama_text = translate_with_ollama(source_text)
-                    if ollama_text:
-                        ollama_memory[source_text] = ollama_text
-                
-                # Store translations
-                if claude_text:
-                    df.iloc[index, 3] = claude_text  # Column D is index 3
-                if ollama_text:
-                    df.iloc[index, 4] = ollama_text  # Column E is index 4
-                
-                # Print progress
-                print(f"\nProcessed row {index + 1}/{total_rows}")
-                print(f"Source: {source_text}")
-                print(f"Claude Translation: {claude_text}")
-                print(f"Ollama Translation: {ollama_text}")
-                
-                # Add delay to avoid API rate limits
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error processing row {index + 1}: {str(e)}")
-                continue
+                if translation:
+                    memories[name][text] = translation
+                if done % 10 == 0:
+                    print(f"Processed {done}/{len(futures)} requests")
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+            for name, config in BACKENDS.items():
+                save_memory(memories[name], config['memory_file'])
+        
+        # Store successful translations only, keeping existing cells where a backend failed
+        for name, column in (('claude', df.columns[3]), ('ollama', df.columns[4])):  # Columns D and E
+            mapped = source.map(memories[name])
+            ok = mapped.notna()
+            df[column] = df[column].astype(object)  # An empty column is read as float
+            df.loc[mapped.index[ok], column] = mapped[ok]
+        
+        # Score agreement between both outputs and flag only the rows that need a reviewer
+        scores = score_agreement(source, df.loc[source.index, df.columns[3]], df.loc[source.index, df.columns[4]])
+        df.loc[scores.index, 'Agreement'] = scores['agreement']
+        df['Needs Review'] = False
+        df.loc[scores.index, 'Needs Review'] = scores['needs_review']
+        
+        review = df.loc[scores.index[scores['needs_review']]]
+        if len(review):
+            review_file = f"{os.path.splitext(output_file)[0]}_review.xlsx"
+            review.join(scores[['claude_tags_ok', 'ollama_tags_ok']]).to_excel(review_file)
+            print(f"Flagged {len(review)}/{len(scores)} low-agreement rows for review: {review_file}")
         
         # Save the result
         df.to_excel(output_file, index=False)
         print(f"\nTranslation completed. Output saved to {output_file}")
+        ledger.print_report()
         
     except Exception as e:
         print(f"Error processing Excel file: {str(e)}")
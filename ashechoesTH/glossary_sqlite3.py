@@ -1,21 +1,425 @@
 import sqlite3
+import json
+import os
+import threading
+from collections import OrderedDict
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from difflib import SequenceMatcher
 from datetime import datetime
 import pandas as pd
-from typing import List, Tuple, Optional
+from typing import Iterable, Iterator, List, Tuple, Optional, Union
 import logging
 
+# Applied to every connection: WAL lets readers run alongside the writer, and with synchronous=NORMAL
+# a commit no longer waits for an fsync (the database stays consistent, only the last commits can be lost on power failure)
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # 64 MB page cache
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,  # 256 MB
+}
+
+SCHEMA_VERSION = 2
+
+INSERT_HISTORY_SQL = '''
+    INSERT INTO translation_history 
+    (translation_id, source_text, target_text)
+    VALUES (?, ?, ?)
+'''
+
+# One row per (source, target): a repeated pair counts towards its own frequency
+UPSERT_TRANSLATION_SQL = '''
+    INSERT INTO translations 
+    (source_text, target_text, confidence_score)
+    VALUES (?, ?, ?)
+    ON CONFLICT (source_text, target_text) DO UPDATE SET
+        frequency = frequency + 1,
+        confidence_score = MAX(confidence_score, excluded.confidence_score),
+        last_used = CURRENT_TIMESTAMP
+    RETURNING id
+'''
+
+# Answered from idx_translations_lookup alone, without sorting or touching the table
+SELECT_TRANSLATION_SQL = '''
+    SELECT target_text 
+    FROM translations 
+    WHERE source_text = ?
+    ORDER BY frequency DESC, confidence_score DESC 
+    LIMIT 1
+'''
+
+# Migration of databases created before the unique key: duplicate (source, target) rows are merged
+# into the oldest one (frequencies summed, highest confidence kept, history re-pointed), then the
+# plain source index is replaced by the unique key and the covering lookup index
+MIGRATION_SQL = [
+    '''
+    CREATE TEMP TABLE merged_pairs AS
+    SELECT MIN(id) AS id, source_text, target_text, SUM(frequency) AS frequency,
+           MAX(confidence_score) AS confidence_score, MIN(created_at) AS created_at, MAX(last_used) AS last_used
+    FROM translations
+    GROUP BY source_text, target_text
+    HAVING COUNT(*) > 1
+    ''',
+    '''
+    UPDATE translation_history
+    SET translation_id = m.id
+    FROM translations t
+    JOIN merged_pairs m ON m.source_text = t.source_text AND m.target_text = t.target_text
+    WHERE translation_history.translation_id = t.id AND t.id != m.id
+    ''',
+    '''
+    DELETE FROM translations
+    WHERE id IN (
+        SELECT t.id FROM translations t
+        JOIN merged_pairs m ON m.source_text = t.source_text AND m.target_text = t.target_text
+        WHERE t.id != m.id
+    )
+    ''',
+    '''
+    UPDATE translations
+    SET frequency = m.frequency, confidence_score = m.confidence_score,
+        created_at = m.created_at, last_used = m.last_used
+    FROM merged_pairs m
+    WHERE translations.id = m.id
+    ''',
+    'DROP TABLE merged_pairs',
+    'DROP INDEX IF EXISTS idx_source_text',
+]
+
+INDEX_SQL = [
+    '''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_translations_pair 
+    ON translations(source_text, target_text)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_translations_lookup 
+    ON translations(source_text, frequency DESC, confidence_score DESC, target_text)
+    ''',
+]
+
+# Trigram full-text index over source_text, kept in sync with translations by triggers. The trigram
+# tokenizer needs no word boundaries, so it works for Chinese; the vocab table gives the number of
+# segments containing each trigram
+FTS_SQL = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS translations_fts 
+    USING fts5(source_text, content='translations', content_rowid='id', tokenize='trigram')
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS translations_fts_vocab 
+    USING fts5vocab(translations_fts, 'row')
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS translations_fts_insert AFTER INSERT ON translations BEGIN
+        INSERT INTO translations_fts(rowid, source_text) VALUES (new.id, new.source_text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS translations_fts_delete AFTER DELETE ON translations BEGIN
+        INSERT INTO translations_fts(translations_fts, rowid, source_text) VALUES ('delete', old.id, old.source_text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS translations_fts_update AFTER UPDATE OF source_text ON translations BEGIN
+        INSERT INTO translations_fts(translations_fts, rowid, source_text) VALUES ('delete', old.id, old.source_text);
+        INSERT INTO translations_fts(rowid, source_text) VALUES (new.id, new.source_text);
+    END
+    ''',
+    "INSERT INTO translations_fts(translations_fts) VALUES ('rebuild')",
+]
+
+# Statements that bring a database from the previous version to each version
+MIGRATIONS = {
+    1: MIGRATION_SQL + INDEX_SQL,
+    2: FTS_SQL,
+}
+
+# Fuzzy search first requires this many of the text's rarest trigrams, then fewer, until enough
+# candidates are found. These stages are ranked by bm25; the last stage ORs at most MAX_QUERY_TRIGRAMS
+# of them and is only capped by the candidate limit, since ranking it would score most of the corpus.
+QUERY_STAGES = (6, 3, 1)
+MAX_QUERY_TRIGRAMS = 12
+
+# Set-based merge of the staging table: each (source, target) is upserted once with its summed
+# occurrences, giving the same frequencies and confidences as calling add_translation for every staged pair
+MERGE_SQL = [
+    '''
+    CREATE TEMP TABLE staged_pairs AS
+    SELECT source_text, target_text, SUM(weight) AS occurrences, MIN(seq) AS first_seq,
+           MAX(confidence_score) AS confidence_score
+    FROM staging
+    GROUP BY source_text, target_text
+    ''',
+    # Sources with more than one target among the staged and stored pairs, the only ones whose
+    # preferred translation can differ from a staged target and so produce history rows
+    '''
+    CREATE TEMP TABLE contested AS
+    SELECT source_text FROM (
+        SELECT source_text, target_text FROM staged_pairs
+        UNION
+        SELECT source_text, target_text FROM translations
+        WHERE source_text IN (SELECT source_text FROM staged_pairs)
+    )
+    GROUP BY source_text
+    HAVING COUNT(*) > 1
+    ''',
+]
+
+# Stored and staged pairs of contested sources, replayed in order to find history rows
+CONTESTED_STORED_SQL = '''
+    SELECT source_text, target_text, frequency, confidence_score FROM translations
+    WHERE source_text IN (SELECT source_text FROM contested)
+'''
+CONTESTED_STAGED_SQL = '''
+    SELECT source_text, target_text, confidence_score, weight FROM staging
+    WHERE source_text IN (SELECT source_text FROM contested)
+    ORDER BY seq
+'''
+
+UPSERT_STAGED_SQL = '''
+    INSERT INTO translations (source_text, target_text, confidence_score, frequency)
+    SELECT source_text, target_text, confidence_score, occurrences
+    FROM staged_pairs
+    WHERE true
+    ORDER BY first_seq
+    ON CONFLICT (source_text, target_text) DO UPDATE SET
+        frequency = frequency + excluded.frequency,
+        confidence_score = MAX(confidence_score, excluded.confidence_score),
+        last_used = CURRENT_TIMESTAMP
+'''
+
+INSERT_PAIR_HISTORY_SQL = '''
+    INSERT INTO translation_history (translation_id, source_text, target_text)
+    SELECT id, source_text, target_text FROM translations
+    WHERE source_text = ? AND target_text = ?
+'''
+
+def replay_history(stored: Iterable[Tuple[str, str, int, float]],
+                   staged: Iterable[Tuple[str, str, float, int]]) -> List[Tuple[str, str]]:
+    """
+    The history rows add_translation would write for the staged pairs, in order: each added pair is
+    compared with the source's preferred translation at that moment (highest frequency, then confidence,
+    then target text, as SELECT_TRANSLATION_SQL reads them from idx_translations_lookup)
+    
+    Args:
+        stored: (source, target, frequency, confidence) of pairs already in the database
+        staged: (source, target, confidence, weight) of pairs in import order; weight counts repeated adds
+    
+    Returns:
+        List[Tuple[str, str]]: (source, target) of each history row
+    """
+    candidates = {}
+    for source, target, frequency, confidence in stored:
+        candidates.setdefault(source, {})[target] = [frequency, confidence]
+    
+    def _preferred(targets):
+        return min(targets, key=lambda target: (-targets[target][0], -(targets[target][1] or 0), target))
+    
+    history = []
+    for source, target, confidence, weight in staged:
+        targets = candidates.setdefault(source, {})
+        for added in range(weight):
+            if targets and _preferred(targets) != target:
+                history.append((source, target))
+            elif targets:
+                # Already preferred; more adds only raise its frequency
+                pair = targets[target]
+                pair[0] += weight - added
+                pair[1] = max(pair[1] or 0, confidence or 0)
+                break
+            pair = targets.setdefault(target, [0, confidence])
+            pair[0] += 1
+            pair[1] = max(pair[1] or 0, confidence or 0)
+    return history
+
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
+def read_excel_pairs(path: str, source_column: Optional[str] = None,
+                     target_column: Optional[str] = None) -> Iterator[Tuple[str, str, int]]:
+    """
+    Read (source, target, 1) pairs from every sheet of an Excel file
+    
+    Args:
+        path (str): Excel file
+        source_column (str): Source column name; the first column if None
+        target_column (str): Target column name; the second column if None
+    """
+    for df in pd.read_excel(path, sheet_name=None).values():
+        if df.shape[1] < 2:
+            continue
+        source = df[source_column] if source_column else df.iloc[:, 0]
+        target = df[target_column] if target_column else df.iloc[:, 1]
+        pairs = pd.DataFrame({'source': source, 'target': target}).dropna()
+        pairs = pairs.astype(str).apply(lambda col: col.str.strip())
+        pairs = pairs[(pairs['source'] != '') & (pairs['target'] != '')]
+        for source_text, target_text in pairs.itertuples(index=False):
+            yield source_text, target_text, 1
+
+def read_tm_json_pairs(path: str) -> Iterator[Tuple[str, str, int]]:
+    """
+    Read pairs from a translation_memory.json saved by the translation systems
+    ({source: {'target', 'frequency', 'alternatives'}}). The target carries the frequency not
+    accounted for by the alternatives, each alternative counts once.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        memory = json.load(f)
+    for source_text, entry in memory.items():
+        if not entry.get('target'):
+            continue
+        alternatives = [alt for alt in entry.get('alternatives', []) if alt and alt != entry['target']]
+        yield source_text, entry['target'], max(int(entry.get('frequency', 1)) - len(alternatives), 1)
+        for alternative in alternatives:
+            yield source_text, alternative, 1
+
+def read_tmx_pairs(path: str, source_lang: Optional[str] = None,
+                   target_lang: Optional[str] = None) -> Iterator[Tuple[str, str, int]]:
+    """
+    Stream (source, target, 1) pairs from a TMX file
+    
+    Args:
+        path (str): TMX file
+        source_lang (str): Source language prefix (e.g. 'zh'); the header's srclang if None
+        target_lang (str): Target language prefix (e.g. 'th'); the first other language if None
+    """
+    def _lang(element):
+        return (element.get(XML_LANG) or element.get('lang') or '').lower()
+    
+    for _, element in ET.iterparse(path, events=('end',)):
+        if element.tag == 'header' and source_lang is None:
+            source_lang = element.get('srclang')
+        elif element.tag == 'tu':
+            segments = [
+                (_lang(tuv), ''.join(tuv.find('seg').itertext()).strip())
+                for tuv in element.iter('tuv') if tuv.find('seg') is not None
+            ]
+            source = next((seg for lang, seg in segments
+                           if source_lang and lang.startswith(source_lang.lower())), None)
+            target = next((seg for lang, seg in segments
+                           if (lang.startswith(target_lang.lower()) if target_lang
+                               else not (source_lang and lang.startswith(source_lang.lower())))), None)
+            if source and target:
+                yield source, target, 1
+            element.clear()
+
 class TranslationDatabase:
-    def __init__(self, db_path: str = 'translation_memory.db'):
+    def __init__(self, db_path: str = 'translation_memory.db', log_every: int = 10000, cache_size: int = 0):
         """
         Initialize the translation database
         
+        One connection is kept open for the lifetime of the instance (call close() when done).
+        SQL statements are module constants, so sqlite3's statement cache prepares each once.
+        
         Args:
             db_path (str): Path to SQLite database file
+            log_every (int): Log one summary line per this many added translations
+            cache_size (int): Keep up to this many get_translation results in an in-process LRU cache
+                (0 disables it); writes through this instance invalidate the affected entries
         """
         self.db_path = db_path
+        self.log_every = log_every
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._pending_log = 0
+        self._lock = threading.RLock()
+        self._in_batch = False
         self.setup_logging()
+        self.conn = self.connect()
         self.initialize_database()
 
+    def connect(self) -> sqlite3.Connection:
+        """Open the long-lived connection and apply the performance pragmas"""
+        # Autocommit mode; transactions are opened explicitly in transaction()
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False, cached_statements=256)
+        for pragma, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed operations in one transaction; nested uses join the outer one.
+        Rolls back on error.
+        """
+        with self._lock:
+            if self._in_batch:
+                yield self.conn.cursor()
+                return
+            self._in_batch = True
+            self.conn.execute('BEGIN')
+            try:
+                yield self.conn.cursor()
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                # Cached lookups may have seen the rolled back writes
+                self._cache.clear()
+                raise
+            finally:
+                self._in_batch = False
+
+    def _invalidate(self, source: Optional[str] = None):
+        """Drop the cached lookup of source, or the whole cache if None"""
+        if source is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(source, None)
+
+    def get_cache_statistics(self) -> dict:
+        """
+        Get LRU cache statistics
+        
+        Returns:
+            dict: Size, capacity, hits, misses and hit rate of the get_translation cache
+        """
+        with self._lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                'cache_size': len(self._cache),
+                'cache_capacity': self.cache_size,
+                'cache_hits': self._cache_hits,
+                'cache_misses': self._cache_misses,
+                'cache_hit_rate': round(self._cache_hits / lookups, 4) if lookups else 0
+            }
+
+    def batch(self):
+        """
+        Group many add_translation calls into one transaction:
+        
+            with db.batch():
+                for source, target in pairs:
+                    db.add_translation(source, target)
+        """
+        return self.transaction()
+
+    def _log_added(self, source: str, target: str):
+        """Per-translation details go to DEBUG; INFO gets one line per log_every translations"""
+        self.logger.debug(f"Translation added/updated: {source} -> {target}")
+        self._pending_log += 1
+        if self._pending_log >= self.log_every:
+            self.flush_log()
+
+    def flush_log(self):
+        """Log the number of translations added since the last summary"""
+        if self._pending_log:
+            self.logger.info(f"{self._pending_log} translations added/updated")
+            self._pending_log = 0
+
+    def close(self):
+        """Flush the log summary and close the connection"""
+        with self._lock:
+            self.flush_log()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def setup_logging(self):
         """Configure logging for database operations"""
         logging.basicConfig(
@@ -31,9 +435,7 @@ class TranslationDatabase:
     def initialize_database(self):
         """Create database tables if they don't exist"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
+            with self.transaction() as cursor:
                 # Main translations table
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS translations (
@@ -47,12 +449,6 @@ class TranslationDatabase:
                     )
                 ''')
                 
-                # Create index for faster lookups
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_source_text 
-                    ON translations(source_text)
-                ''')
-                
                 # History table for tracking changes
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS translation_history (
@@ -65,16 +461,38 @@ class TranslationDatabase:
                     )
                 ''')
                 
-                conn.commit()
-                self.logger.info("Database initialized successfully")
+                self.migrate(cursor)
+                
+            self.logger.info("Database initialized successfully")
         except sqlite3.Error as e:
             self.logger.error(f"Database initialization error: {e}")
             raise
 
+    def migrate(self, cursor: sqlite3.Cursor):
+        """
+        Bring the schema up to SCHEMA_VERSION (tracked in PRAGMA user_version)
+        
+        Version 1 adds the unique key on (source_text, target_text) and the covering lookup index
+        on (source_text, frequency DESC, confidence_score DESC, target_text).
+        Version 2 adds the trigram full-text index over source_text used by search_similar.
+        """
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        
+        for target_version in range(version + 1, SCHEMA_VERSION + 1):
+            for statement in MIGRATIONS[target_version]:
+                cursor.execute(statement)
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.logger.info(f"Database schema migrated from version {version} to {SCHEMA_VERSION}")
+
     def add_translation(self, source: str, target: str, confidence: float = 1.0) -> bool:
         """
         Add a new translation or update existing one
         
+        Each (source, target) pair has its own row: adding it again increases its frequency and
+        keeps the higher confidence. A target other than the preferred translation is logged in the history.
+        
         Args:
             source (str): Source language text
             target (str): Target language text
@@ -84,56 +502,99 @@ class TranslationDatabase:
             bool: Success status
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self.transaction() as cursor:
+                # Preferred translation before this add
+                preferred = cursor.execute(SELECT_TRANSLATION_SQL, (source,)).fetchone()
                 
-                # Check if translation exists
-                cursor.execute('''
-                    SELECT id, frequency, target_text 
-                    FROM translations 
-                    WHERE source_text = ?
-                ''', (source,))
-                
-                result = cursor.fetchone()
-                
-                if result:
-                    translation_id, frequency, existing_target = result
-                    
-                    # Update frequency and last_used timestamp
-                    cursor.execute('''
-                        UPDATE translations 
-                        SET frequency = frequency + 1,
-                            last_used = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                    ''', (translation_id,))
-                    
-                    # Log change in history if target text is different
-                    if existing_target != target:
-                        cursor.execute('''
-                            INSERT INTO translation_history 
-                            (translation_id, source_text, target_text)
-                            VALUES (?, ?, ?)
-                        ''', (translation_id, source, target))
-                else:
-                    # Insert new translation
-                    cursor.execute('''
-                        INSERT INTO translations 
-                        (source_text, target_text, confidence_score)
-                        VALUES (?, ?, ?)
-                    ''', (source, target, confidence))
+                # Insert the pair, or count it again and keep its highest confidence
+                translation_id = cursor.execute(UPSERT_TRANSLATION_SQL, (source, target, confidence)).fetchone()[0]
+                
+                # Log change in history if target text is different
+                if preferred and preferred[0] != target:
+                    cursor.execute(INSERT_HISTORY_SQL, (translation_id, source, target))
+                
+                self._invalidate(source)
                 
-                conn.commit()
-                self.logger.info(f"Translation added/updated: {source} -> {target}")
-                return True
+            self._log_added(source, target)
+            return True
                 
         except sqlite3.Error as e:
             self.logger.error(f"Error adding translation: {e}")
             return False
 
+    def add_translations_bulk(self, pairs: Union[str, Iterable[Tuple[str, str]]], confidence: float = 1.0,
+                              source_lang: Optional[str] = None, target_lang: Optional[str] = None,
+                              source_column: Optional[str] = None, target_column: Optional[str] = None) -> int:
+        """
+        Add many translations at once, with the same frequencies and history as calling add_translation
+        for each pair in order
+        
+        Pairs are loaded into a temporary staging table and merged with set-based SQL in one transaction;
+        only sources with competing targets are replayed pair by pair to find their history rows.
+        
+        Args:
+            pairs: An .xlsx training file, a translation_memory.json, a .tmx file,
+                or an iterable of (source, target) tuples
+            confidence (float): Confidence score of newly inserted translations
+            source_lang, target_lang (str): Language codes for TMX files
+            source_column, target_column (str): Column names for Excel files
+        
+        Returns:
+            int: Number of pairs staged (0 on error)
+        """
+        if isinstance(pairs, str):
+            extension = os.path.splitext(pairs)[1].lower()
+            if extension in ('.xlsx', '.xls'):
+                rows = read_excel_pairs(pairs, source_column, target_column)
+            elif extension == '.json':
+                rows = read_tm_json_pairs(pairs)
+            elif extension == '.tmx':
+                rows = read_tmx_pairs(pairs, source_lang, target_lang)
+            else:
+                raise ValueError(f"Unsupported bulk import file: {pairs}")
+        else:
+            rows = ((source, target, 1) for source, target in pairs)
+        
+        try:
+            with self.transaction() as cursor:
+                cursor.execute('''
+                    CREATE TEMP TABLE staging (
+                        seq INTEGER PRIMARY KEY,
+                        source_text TEXT NOT NULL,
+                        target_text TEXT NOT NULL,
+                        confidence_score FLOAT,
+                        weight INTEGER
+                    )
+                ''')
+                cursor.executemany(
+                    'INSERT INTO staging (source_text, target_text, confidence_score, weight) VALUES (?, ?, ?, ?)',
+                    ((source, target, confidence, weight) for source, target, weight in rows if source and target)
+                )
+                staged = cursor.execute('SELECT COUNT(*) FROM staging').fetchone()[0]
+                for statement in MERGE_SQL:
+                    cursor.execute(statement)
+                history = replay_history(cursor.execute(CONTESTED_STORED_SQL).fetchall(),
+                                         cursor.execute(CONTESTED_STAGED_SQL))
+                cursor.execute(UPSERT_STAGED_SQL)
+                cursor.executemany(INSERT_PAIR_HISTORY_SQL, history)
+                for table in ('staging', 'staged_pairs', 'contested'):
+                    cursor.execute(f'DROP TABLE {table}')
+                
+                self._invalidate()
+            
+            self.logger.info(f"Bulk import: {staged} translations added/updated")
+            return staged
+            
+        except sqlite3.Error as e:
+            self.logger.error(f"Error in bulk import: {e}")
+            return 0
+
     def get_translation(self, source: str) -> Optional[str]:
         """
         Retrieve translation for source text
         
+        Served from the LRU cache when enabled (cache_size > 0); the database stays the source of truth.
+        
         Args:
             source (str): Source language text
         
@@ -141,23 +602,98 @@ class TranslationDatabase:
             Optional[str]: Target language text if found
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT target_text 
-                    FROM translations 
-                    WHERE source_text = ?
-                    ORDER BY frequency DESC, confidence_score DESC 
-                    LIMIT 1
-                ''', (source,))
+            with self._lock:
+                if self.cache_size:
+                    if source in self._cache:
+                        self._cache_hits += 1
+                        self._cache.move_to_end(source)
+                        return self._cache[source]
+                    self._cache_misses += 1
+                
+                result = self.conn.execute(SELECT_TRANSLATION_SQL, (source,)).fetchone()
+                translation = result[0] if result else None
                 
-                result = cursor.fetchone()
-                return result[0] if result else None
+                if self.cache_size:
+                    self._cache[source] = translation
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            return translation
                 
         except sqlite3.Error as e:
             self.logger.error(f"Error retrieving translation: {e}")
             return None
 
+    def search_similar(self, text: str, k: int = 5, min_score: float = 0.0) -> List[dict]:
+        """
+        Fuzzy translation memory search
+        
+        Candidates come from the trigram index: segments containing all of the text's rarest trigrams,
+        then fewer of them (see QUERY_STAGES), ranked by bm25 within those few segments; an unranked OR
+        of them is the last resort. Candidates are then scored by SequenceMatcher similarity to the text. Texts shorter
+        than three characters fall back to a substring scan.
+        
+        Args:
+            text (str): Text to find similar segments for
+            k (int): Maximum number of matches
+            min_score (float): Lowest similarity (0-1) to return
+        
+        Returns:
+            List[dict]: source_text, target_text (the preferred translation) and score, best first
+        """
+        text = text.strip()
+        if not text:
+            return []
+        candidates_limit = max(k * 10, 50)
+        trigrams = list(dict.fromkeys(text[i:i + 3].lower() for i in range(len(text) - 2)))
+        
+        try:
+            with self._lock:
+                if trigrams:
+                    placeholders = ', '.join('?' * len(trigrams))
+                    counts = self.conn.execute(
+                        f'SELECT term, doc FROM translations_fts_vocab WHERE term IN ({placeholders})', trigrams
+                    ).fetchall()
+                    rarest = ['"' + term.replace('"', '""') + '"'
+                              for term, _ in sorted(counts, key=lambda item: item[1])[:MAX_QUERY_TRIGRAMS]]
+                    if not rarest:
+                        return []
+                    stages = {' AND '.join(rarest[:size]): 'ORDER BY rank'
+                              for size in QUERY_STAGES if size <= len(rarest)}
+                    stages.setdefault(' OR '.join(rarest), '')
+                    rows = []
+                    for query, order in stages.items():
+                        rows += self.conn.execute(f'''
+                            SELECT source_text FROM translations_fts 
+                            WHERE translations_fts MATCH ? 
+                            {order}
+                            LIMIT ?
+                        ''', (query, candidates_limit)).fetchall()
+                        if len(rows) >= k:
+                            break
+                else:
+                    pattern = '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                    rows = self.conn.execute(
+                        "SELECT source_text FROM translations WHERE source_text LIKE ? ESCAPE '\\' LIMIT ?",
+                        (pattern, candidates_limit)
+                    ).fetchall()
+                
+                scored = sorted(
+                    ((SequenceMatcher(None, text, source).ratio(), source) for source in {row[0] for row in rows}),
+                    reverse=True
+                )[:k]
+                return [
+                    {
+                        'source_text': source,
+                        'target_text': self.conn.execute(SELECT_TRANSLATION_SQL, (source,)).fetchone()[0],
+                        'score': round(score, 4)
+                    }
+                    for score, source in scored if score >= min_score
+                ]
+                
+        except sqlite3.Error as e:
+            self.logger.error(f"Error searching similar translations: {e}")
+            return []
+
     def export_to_excel(self, output_path: str) -> bool:
         """
         Export translations to Excel file
@@ -169,16 +705,16 @@ class TranslationDatabase:
             bool: Success status
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                query = '''
-                    SELECT source_text, target_text, frequency, confidence_score 
-                    FROM translations 
-                    ORDER BY frequency DESC
-                '''
-                df = pd.read_sql_query(query, conn)
-                df.to_excel(output_path, index=False)
-                self.logger.info(f"Translations exported to {output_path}")
-                return True
+            query = '''
+                SELECT source_text, target_text, frequency, confidence_score 
+                FROM translations 
+                ORDER BY frequency DESC
+            '''
+            with self._lock:
+                df = pd.read_sql_query(query, self.conn)
+            df.to_excel(output_path, index=False)
+            self.logger.info(f"Translations exported to {output_path}")
+            return True
                 
         except (sqlite3.Error, pd.errors.EmptyDataError) as e:
             self.logger.error(f"Error exporting translations: {e}")
@@ -192,8 +728,8 @@ class TranslationDatabase:
             dict: Statistics about the translations database
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self.conn.cursor()
                 
                 # Get total count
                 cursor.execute('SELECT COUNT(*) FROM translations')
@@ -211,12 +747,15 @@ class TranslationDatabase:
                 ''')
                 frequent_count = cursor.fetchone()[0]
                 
-                return {
+                stats = {
                     'total_translations': total_count,
                     'average_confidence': round(avg_confidence, 2) if avg_confidence else 0,
                     'frequent_translations': frequent_count,
                     'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 }
+                if self.cache_size:
+                    stats.update(self.get_cache_statistics())
+                return stats
                 
         except sqlite3.Error as e:
             self.logger.error(f"Error getting statistics: {e}")
@@ -224,8 +763,8 @@ class TranslationDatabase:
 
 # Usage example
 if __name__ == "__main__":
-    # Initialize database
-    db = TranslationDatabase()
+    # Initialize database with a lookup cache
+    db = TranslationDatabase(cache_size=10000)
     
     # Add some sample translations
     db.add_translation("白荆回廊", "Ash Echoes", 0.95)
@@ -242,4 +781,6 @@ if __name__ == "__main__":
     stats = db.get_statistics()
     print("Database Statistics:")
     for key, value in stats.items():
-        print(f"{key}: {value}")
\ No newline at end of file
+        print(f"{key}: {value}")
+    
+    db.close()
\ No newline at end of file
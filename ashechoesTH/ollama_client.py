@@ -0,0 +1,162 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_URL = "http://localhost:11434"
+
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+# Explanations small models put before the actual translation: a lead-in phrase ending in a colon or line break
+ENGLISH_PREAMBLE_PATTERN = re.compile(
+    r"^\s*(?:here is|here's|sure|certainly|the translation|translation)\b[^:\n]{0,80}[:\n]",
+    re.IGNORECASE
+)
+THAI_PREAMBLE_PATTERN = re.compile(r'^\s*(?:ต่อไปนี้คือ|นี่คือคำแปล|คำแปล)[^:\n]{0,80}[:\n]')
+
+# Output length allowed per source character; Thai and English run 3-4.5 characters per Chinese character
+LENGTH_RATIO = 3.0
+CJK_LENGTH_RATIO = 6.0
+
+class GenerationAborted(Exception):
+    """Raised when a streamed generation is cut off by its validator"""
+    def __init__(self, reason: str, partial: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial = partial
+
+def make_output_validator(source_text: str, forbid_cjk: bool = True, max_length_ratio: Optional[float] = None,
+                          min_length: int = 40, check_english_preamble: bool = True) -> Callable[[str], Optional[str]]:
+    """
+    Build a validator for generate_stream that returns an abort reason, or None while the output looks fine:
+    a CJK character (for Thai/English targets), an explanation preamble, or output longer than
+    max_length_ratio times the source (at least min_length characters). max_length_ratio defaults to
+    CJK_LENGTH_RATIO for a source containing Chinese and LENGTH_RATIO otherwise.
+    Pass check_english_preamble=False when the target is English, where "Sure" or "Here is" can be the translation.
+    """
+    if max_length_ratio is None:
+        max_length_ratio = CJK_LENGTH_RATIO if CJK_PATTERN.search(source_text) else LENGTH_RATIO
+    max_length = max(int(len(source_text) * max_length_ratio), min_length)
+
+    def _validate(output: str) -> Optional[str]:
+        if forbid_cjk and CJK_PATTERN.search(output):
+            return "CJK character in output"
+        if THAI_PREAMBLE_PATTERN.match(output) or (check_english_preamble and ENGLISH_PREAMBLE_PATTERN.match(output)):
+            return "explanation preamble"
+        if len(output) > max_length:
+            return f"output longer than {max_length} characters"
+        return None
+
+    return _validate
+
+class OllamaClient:
+    def __init__(self, base_url: str = DEFAULT_URL, num_parallel: Optional[int] = None,
+                 keep_alive: str = "30m", timeout: float = 300, ledger=None):
+        """
+        Shared Ollama client: one pooled requests.Session with keep-alive connections and at most
+        num_parallel requests in flight, matching the server's OLLAMA_NUM_PARALLEL (default 4).
+        keep_alive is passed on every call so the model stays loaded between batches.
+        If a UsageLedger is set as ledger, every completed generation is recorded in it.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.num_parallel = num_parallel or int(os.environ.get('OLLAMA_NUM_PARALLEL', 4))
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.num_parallel)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(self.num_parallel)
+        self.ledger = ledger
+
+    def generate(self, model: str, prompt: str, **options) -> dict:
+        """Run one non-streaming /api/generate call and return the response JSON; raises on HTTP errors"""
+        payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive, **options}
+        with self._slots:
+            response = self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        result = response.json()
+        if self.ledger is not None:
+            self.ledger.record_ollama(model, result)
+        return result
+
+    def generate_stream(self, model: str, prompt: str, validator: Optional[Callable[[str], Optional[str]]] = None,
+                        **options) -> dict:
+        """
+        Run a streaming /api/generate call, checking the accumulated text with validator after every chunk.
+        Returns the final chunk with the full text in 'response', like generate; raises GenerationAborted
+        and closes the connection as soon as the validator returns a reason.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive, **options}
+        text = []
+        with self._slots:
+            with self.session.post(f"{self.base_url}/api/generate", json=payload,
+                                   timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    text.append(chunk.get('response', ''))
+                    if validator is not None:
+                        reason = validator(''.join(text))
+                        if reason:
+                            raise GenerationAborted(reason, ''.join(text))
+                    if chunk.get('done'):
+                        if self.ledger is not None:
+                            self.ledger.record_ollama(model, chunk)
+                        return {**chunk, 'response': ''.join(text)}
+        raise GenerationAborted("stream ended before done", ''.join(text))
+
+    def generate_validated(self, model: str, prompt: str, validator: Callable[[str], Optional[str]],
+                           retries: int = 2, **options) -> dict:
+        """Stream with validator and retry right away on abort; after the last retry the abort propagates"""
+        for attempt in range(retries + 1):
+            try:
+                return self.generate_stream(model, prompt, validator, **options)
+            except GenerationAborted as e:
+                if attempt == retries:
+                    raise
+                print(f"Aborted generation ({e.reason}), retrying... ({retries - attempt} attempts left)")
+
+    def map(self, func: Callable, items: Iterable) -> List:
+        """Apply func (typically a helper that calls generate) to every item with num_parallel workers, keeping order"""
+        with ThreadPoolExecutor(max_workers=self.num_parallel) as executor:
+            return list(executor.map(func, items))
+
+    def health_check(self) -> bool:
+        """True if the server answers"""
+        try:
+            return self.session.get(f"{self.base_url}/api/tags", timeout=5).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def has_model(self, model: str) -> bool:
+        """True if the model is pulled on the server"""
+        try:
+            return self.session.post(f"{self.base_url}/api/show", json={"name": model}, timeout=10).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def warmup(self, model: str) -> None:
+        """Load the model into memory ahead of the first real request (an empty prompt only loads it)"""
+        response = self.session.post(f"{self.base_url}/api/generate",
+                                     json={"model": model, "prompt": "", "keep_alive": self.keep_alive},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_client() -> OllamaClient:
+    """Process-wide shared client, so every helper reuses one connection pool"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            host = os.environ.get('OLLAMA_HOST', DEFAULT_URL)
+            _default_client = OllamaClient(host if '://' in host else f"http://{host}")
+        return _default_client
@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class OllamaStubServer:
+    def __init__(self, reply="คำแปลทดสอบ", delay: float = 0.0, models=("llama3.2:3b",), port: int = 0,
+                 chunk_size: int = 4):
+        """
+        Local stand-in for the Ollama HTTP API (/api/generate, /api/tags, /api/show) to exercise
+        OllamaClient without a model. reply is a fixed string or a callable taking the prompt;
+        delay simulates generation time. Requests with "stream" (the Ollama default) get NDJSON chunks of
+        chunk_size characters. Use as a context manager; base_url points at it.
+        """
+        self.reply = reply
+        self.delay = delay
+        self.models = set(models)
+        self.requests = []  # Every payload received, for assertions
+        self.max_in_flight = 0
+        self.chunk_size = chunk_size
+        self.aborted_streams = 0  # Streams the client closed before done
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real server
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionResetError:
+                    pass  # The client dropped a kept-alive connection after aborting a stream
+
+            def _send(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._send(200, {'models': [{'name': name} for name in sorted(stub.models)]})
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.requests.append(payload)
+                if self.path == '/api/show':
+                    status = 200 if payload.get('name') in stub.models else 404
+                    self._send(status, {} if status == 200 else {'error': 'model not found'})
+                elif self.path == '/api/generate':
+                    self._generate(payload)
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def _generate(self, payload):
+                with stub._lock:
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                try:
+                    prompt = payload.get('prompt', '')
+                    text = '' if not prompt else (stub.reply(prompt) if callable(stub.reply) else stub.reply)
+                    final = {'model': payload.get('model'), 'done': True,
+                             'prompt_eval_count': len(prompt), 'eval_count': len(text)}
+                    if payload.get('stream', True):
+                        self._stream(text, final, stub.delay if prompt else 0)
+                    else:
+                        time.sleep(stub.delay if prompt else 0)
+                        self._send(200, {**final, 'response': text})
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+
+            def _stream(self, text, final, delay):
+                pieces = [text[i:i + stub.chunk_size] for i in range(0, len(text), stub.chunk_size)]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for piece in pieces:
+                        time.sleep(delay / max(len(pieces), 1))
+                        self._write_chunk({'model': final['model'], 'response': piece, 'done': False})
+                    self._write_chunk({**final, 'response': ''})
+                    self.wfile.write(b'0\r\n\r\n')
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    with stub._lock:
+                        stub.aborted_streams += 1
+                    self.close_connection = True
+
+            def _write_chunk(self, body):
+                data = (json.dumps(body, ensure_ascii=False) + '\n').encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+                self.wfile.flush()
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == "__main__":
+    # Check the streaming validator against replies of realistic length and shape
+    from ollama_client import GenerationAborted, OllamaClient, make_output_validator
+
+    source = '当前体力不足，是否购买体力？'
+    cases = [
+        # (reply, validator options, expected to pass)
+        ('พลังงานปัจจุบันไม่เพียงพอ ต้องการซื้อพลังงานเพิ่มหรือไม่?', {}, True),
+        ('Insufficient stamina. Would you like to purchase more stamina?', {'check_english_preamble': False}, True),
+        ('Sure!', {'check_english_preamble': False}, True),
+        ('Here is the translation:\nพลังงานไม่เพียงพอ', {}, False),
+        ('นี่คือคำแปล: พลังงานไม่เพียงพอ', {}, False),
+        ('พลังงานไม่เพียงพอ 体力', {}, False),
+        ('พลังงาน' * 20, {}, False),
+    ]
+    for reply, options, expected in cases:
+        with OllamaStubServer(reply=reply) as stub:
+            client = OllamaClient(stub.base_url)
+            try:
+                client.generate_stream("llama3.2:3b", source, make_output_validator(source, **options))
+                passed, reason = True, None
+            except GenerationAborted as e:
+                passed, reason = False, e.reason
+        assert passed == expected, (reply, reason)
+        print(f"{'passed' if passed else 'aborted':7} {len(reply):3} chars  {reason or ''}")
+    print("Validator checks OK")
@@ -0,0 +1,42 @@
+import os
+from collections import deque
+from types import SimpleNamespace
+
+class PrefixCachingStub:
+    def __init__(self, reply="คำแปลทดสอบ", min_cached_tokens: int = 1024, block_tokens: int = 128,
+                 chars_per_token: int = 4, max_cached_prompts: int = 64):
+        """
+        Offline stand-in for openai.Client that bills prompts the way provider prefix caching does:
+        the longest prefix shared with a recent prompt counts as cached once it reaches
+        min_cached_tokens, in block_tokens increments. Tokens are approximated by characters.
+        reply: fixed reply text, or a callable taking the messages and returning one
+        """
+        self.reply = reply
+        self.min_cached_tokens = min_cached_tokens
+        self.block_tokens = block_tokens
+        self.chars_per_token = chars_per_token
+        self.recent_prompts = deque(maxlen=max_cached_prompts)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """Tokens of the longest prefix shared with a recent prompt, rounded down to whole cache blocks"""
+        shared_chars = max((len(os.path.commonprefix([prompt, seen])) for seen in self.recent_prompts), default=0)
+        shared_tokens = shared_chars // self.chars_per_token
+        if shared_tokens < self.min_cached_tokens:
+            return 0
+        return shared_tokens // self.block_tokens * self.block_tokens
+
+    def _create(self, model: str, messages: list, **kwargs):
+        """Mimic chat.completions.create, including usage.prompt_tokens_details.cached_tokens"""
+        prompt = "".join(f"{m['role']}:{m['content']}\n" for m in messages)
+        cached_tokens = self._cached_tokens(prompt)
+        self.recent_prompts.append(prompt)
+
+        content = self.reply(messages) if callable(self.reply) else self.reply
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // self.chars_per_token,
+            completion_tokens=len(content) // self.chars_per_token,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        )
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message)], usage=usage)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import jieba
+
+# Game terms jieba should keep whole
+CUSTOM_WORDS = ["同调者收集"]
+
+def build_dictionary(custom_words: Iterable[str] = CUSTOM_WORDS, dict_dir: str = "jieba_dict") -> str:
+    """
+    Write jieba's default dictionary plus the custom words to one dictionary file, once per word list.
+    Each word gets the frequency jieba.add_word would give it. jieba caches the compiled prefix dict of
+    the file next to it, so every later process loads it from that cache instead of rebuilding it.
+    Returns the dictionary path.
+    """
+    custom_words = sorted(set(custom_words))
+    digest = hashlib.md5("\n".join(custom_words).encode('utf-8')).hexdigest()[:12]
+    dict_file = os.path.abspath(os.path.join(dict_dir, f"dict_{digest}.txt"))
+    if os.path.exists(dict_file):
+        return dict_file
+
+    os.makedirs(dict_dir, exist_ok=True)
+    tokenizer = jieba.Tokenizer()
+    tokenizer.initialize()
+    with tokenizer.get_dict_file() as f:
+        default_dictionary = f.read().decode('utf-8').rstrip('\n')
+    lines = [f"{word} {tokenizer.suggest_freq(word, False)}" for word in custom_words]
+
+    temp_file = dict_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(default_dictionary + "\n" + "\n".join(lines) + "\n")
+    os.replace(temp_file, dict_file)
+    return dict_file
+
+def _load_tokenizer(dict_file: str) -> jieba.Tokenizer:
+    """Tokenizer on the pre-built dictionary, with its prefix dict cached next to the file"""
+    tokenizer = jieba.Tokenizer(dict_file)
+    tokenizer.tmp_dir = os.path.dirname(dict_file)
+    tokenizer.initialize()
+    return tokenizer
+
+_worker_tokenizer = None
+
+def _init_worker(dict_file: str) -> None:
+    """Load the dictionary once per worker process"""
+    global _worker_tokenizer
+    jieba.setLogLevel(jieba.logging.WARNING)
+    _worker_tokenizer = _load_tokenizer(dict_file)
+
+def _segment_chunk(texts: List[str]) -> List[List[str]]:
+    """Segment a chunk of texts in a worker process"""
+    return [list(_worker_tokenizer.cut(text, HMM=True)) for text in texts]
+
+class Segmenter:
+    def __init__(self, cache_file: str = "segmentation_cache.json", custom_words: Iterable[str] = CUSTOM_WORDS,
+                 dict_dir: str = "jieba_dict"):
+        """
+        Chinese segmentation service: jieba on a pre-built dictionary with the custom words, a persistent
+        per-text cache of segmentations, and multi-process segmentation of texts not cached yet.
+        The cache belongs to one word list; changing custom_words starts a new cache.
+        """
+        self.dict_file = build_dictionary(custom_words, dict_dir)
+        self.dictionary_id = os.path.basename(self.dict_file)
+        self.cache_file = cache_file
+        self.cache = self._load_cache()
+        self._tokenizer = None
+
+    def _load_cache(self) -> Dict[str, List[str]]:
+        if os.path.exists(self.cache_file):
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('dictionary') == self.dictionary_id:
+                return data['segments']
+        return {}
+
+    def save(self) -> None:
+        """Persist the cache for the next run"""
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'dictionary': self.dictionary_id, 'segments': self.cache},
+                      f, ensure_ascii=False, separators=(',', ':'))
+
+    def segment(self, text: str) -> List[str]:
+        """Segment one text in this process, through the cache"""
+        if text not in self.cache:
+            if self._tokenizer is None:
+                self._tokenizer = _load_tokenizer(self.dict_file)
+            self.cache[text] = list(self._tokenizer.cut(text, HMM=True))
+        return self.cache[text]
+
+    def segment_all(self, texts: Iterable[str], max_workers: Optional[int] = None,
+                    chunksize: int = 500) -> List[List[str]]:
+        """
+        Segment a corpus: each unique text not in the cache is segmented once, spread over max_workers
+        processes in chunks of chunksize texts; results are cached and saved. Returns segments in input order.
+        """
+        texts = list(texts)
+        pending = [text for text in dict.fromkeys(texts) if text not in self.cache]
+        if pending:
+            print(f"Segmenting {len(pending)} new texts ({len(texts) - len(pending)} cached or repeated)")
+            chunks = [pending[i:i + chunksize] for i in range(0, len(pending), chunksize)]
+            if len(chunks) == 1:
+                # Not worth starting worker processes
+                for text in pending:
+                    self.segment(text)
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                         initargs=(self.dict_file,)) as executor:
+                    for chunk, segments in zip(chunks, executor.map(_segment_chunk, chunks)):
+                        self.cache.update(zip(chunk, segments))
+            self.save()
+        return [self.cache[text] for text in texts]
@@ -0,0 +1,130 @@
+import re
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+CJK_RUN_PATTERN = re.compile(r'[\u4e00-\u9fff]+')
+SEPARATOR = 0  # Code between Chinese runs; never part of a match
+
+def build_corpus(texts: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenate the Chinese runs of all texts into one code point array, each run followed by SEPARATOR.
+    Returns the codes and, for every position, the index of the text it came from.
+    """
+    runs, owners = [], []
+    for index, text in enumerate(texts):
+        for run in CJK_RUN_PATTERN.findall(str(text)):
+            runs.append(run)
+            owners.append(index)
+    if not runs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    joined = '\x00'.join(runs) + '\x00'
+    codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    lengths = np.array([len(run) + 1 for run in runs])
+    return codes, np.repeat(np.array(owners), lengths)
+
+def suffix_array(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Suffix array by prefix doubling on numpy arrays: each round sorts suffixes by their first 2k characters.
+    Returns the suffix array and the rank of every suffix.
+    """
+    n = len(codes)
+    rank = codes.copy()
+    sa = np.argsort(rank, kind='stable')
+    k = 1
+    while n > 1:
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        boundaries = (rank[sa][1:] != rank[sa][:-1]) | (second[sa][1:] != second[sa][:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.concatenate(([0], np.cumsum(boundaries)))
+        if rank[sa[-1]] == n - 1 or k >= n:
+            break
+        k *= 2
+    return sa, rank
+
+def lcp_array(codes: np.ndarray, sa: np.ndarray, rank: np.ndarray, max_length: int) -> List[int]:
+    """
+    Kasai's LCP: lcp[r] is the common prefix length of suffixes sa[r - 1] and sa[r], capped at max_length
+    and never running across SEPARATOR.
+    """
+    text, sa, rank = codes.tolist(), sa.tolist(), rank.tolist()
+    n = len(text)
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r == 0:
+            h = 0
+            continue
+        j = sa[r - 1]
+        while h < max_length and i + h < n and j + h < n and text[i + h] == text[j + h] and text[i + h] != SEPARATOR:
+            h += 1
+        lcp[r] = h
+        if h > 0:
+            h -= 1
+    return lcp
+
+def _branching_entropy(neighbours: np.ndarray) -> float:
+    """Entropy of the characters next to a substring's occurrences; every boundary counts as its own character"""
+    boundaries = neighbours == SEPARATOR
+    neighbours = neighbours.copy()
+    neighbours[boundaries] = -1 - np.arange(boundaries.sum())
+    _, counts = np.unique(neighbours, return_counts=True)
+    p = counts / counts.sum()
+    return float(-(p * np.log(p)).sum())
+
+def mine_substrings(texts: Iterable[str], min_frequency: int = 3, min_length: int = 2,
+                    max_length: int = 8, min_entropy: float = 0.0) -> pd.DataFrame:
+    """
+    Find every Chinese substring of min_length to max_length characters that occurs at least
+    min_frequency times in the corpus, using a suffix array and its LCP intervals.
+    Only right-maximal substrings are reported (a shorter one always followed by the same character
+    is part of a longer term). Each is scored by branching entropy: the lower of the entropies of the
+    characters before and after its occurrences, high for substrings that appear in varied contexts;
+    substrings scoring below min_entropy are dropped.
+    Returns a DataFrame of term, frequency, row_frequency, rows (indices of the texts containing it),
+    left_entropy, right_entropy and score, best first.
+    """
+    codes, owners = build_corpus(texts)
+    columns = ['term', 'frequency', 'row_frequency', 'rows', 'left_entropy', 'right_entropy', 'score']
+    if len(codes) == 0:
+        return pd.DataFrame(columns=columns)
+
+    sa, rank = suffix_array(codes)
+    lcp = lcp_array(codes, sa, rank, max_length)
+    padded = np.concatenate(([SEPARATOR], codes, [SEPARATOR]))  # Neighbours past either end are boundaries
+
+    entries = []
+
+    def _report(length, lb, rb, parent_length):
+        if length < min_length or length <= parent_length or rb - lb + 1 < min_frequency:
+            return
+        positions = sa[lb:rb + 1]
+        left = _branching_entropy(padded[positions])  # padded is shifted by one
+        right = _branching_entropy(padded[positions + length + 1])
+        if min(left, right) < min_entropy:
+            return
+        start = int(positions[0])
+        rows = np.unique(owners[positions])
+        entries.append((
+            ''.join(map(chr, codes[start:start + length])), len(positions), len(rows), rows.tolist(),
+            left, right, min(left, right)
+        ))
+
+    # Bottom-up traversal of LCP intervals (internal nodes of the suffix tree)
+    stack = [(0, 0)]  # (lcp, left bound)
+    for i in range(1, len(codes) + 1):
+        current = lcp[i] if i < len(codes) else 0
+        lb = i - 1
+        while current < stack[-1][0]:
+            length, lb = stack.pop()
+            _report(length, lb, i - 1, max(current, stack[-1][0]))
+        if current > stack[-1][0]:
+            stack.append((current, lb))
+
+    return (pd.DataFrame(entries, columns=columns)
+            .sort_values(['score', 'frequency'], ascending=False)
+            .reset_index(drop=True))
@@ -0,0 +1,139 @@
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+UPSERT_SQL = '''
+    INSERT INTO terms (source_term, target_term, confidence, occurrences, explanation)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (source_term, target_term) DO UPDATE SET
+        explanation = CASE WHEN excluded.confidence > terms.confidence OR terms.confidence IS NULL
+                           THEN excluded.explanation ELSE terms.explanation END,
+        confidence = MAX(COALESCE(terms.confidence, excluded.confidence), COALESCE(excluded.confidence, terms.confidence)),
+        occurrences = MAX(terms.occurrences, excluded.occurrences),
+        updated_at = CURRENT_TIMESTAMP
+'''
+
+COLUMNS = ['source_term', 'target_term', 'confidence', 'occurrences', 'explanation']
+
+class TermBaseStore:
+    def __init__(self, db_path: str = 'term_base.db'):
+        """
+        Term base kept in an indexed SQLite table, one row per (source term, target term).
+        Repeated runs upsert into it: a pair seen again keeps the higher confidence (with its
+        explanation) and the higher occurrence count, so re-running on a grown corpus never duplicates.
+
+        Args:
+            db_path (str): Path to SQLite database file
+        """
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.initialize_database()
+
+    def initialize_database(self):
+        """Create the terms table; its unique key also serves exact and prefix lookups by source term"""
+        with self._lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS terms (
+                    source_term TEXT NOT NULL,
+                    target_term TEXT NOT NULL,
+                    confidence FLOAT,
+                    occurrences INTEGER DEFAULT 0,
+                    explanation TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (source_term, target_term)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_terms_target ON terms(target_term)')
+
+    def upsert_terms(self, entries: Iterable[Tuple[str, str, Optional[float], int, Optional[str]]]) -> int:
+        """
+        Insert or merge term pairs in one transaction
+
+        Args:
+            entries: (source_term, target_term, confidence, occurrences, explanation) tuples;
+                confidence and explanation may be None
+
+        Returns:
+            int: Number of entries written
+        """
+        entries = [
+            (str(source), str(target), None if pd.isna(confidence) else float(confidence),
+             int(occurrences), None if pd.isna(explanation) else str(explanation))
+            for source, target, confidence, occurrences, explanation in entries
+        ]
+        with self._lock, self.conn:
+            self.conn.executemany(UPSERT_SQL, entries)
+        return len(entries)
+
+    def _query(self, sql: str, params: tuple) -> List[dict]:
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def lookup(self, source_term: str) -> List[dict]:
+        """
+        Exact lookup of a source term
+
+        Args:
+            source_term (str): Source language term
+
+        Returns:
+            List[dict]: Its target terms, best first (highest confidence, then occurrences)
+        """
+        return self._query(f'''
+            SELECT {", ".join(COLUMNS)} FROM terms
+            WHERE source_term = ?
+            ORDER BY confidence DESC, occurrences DESC
+        ''', (source_term,))
+
+    def lookup_prefix(self, prefix: str, limit: int = 50) -> List[dict]:
+        """
+        Terms whose source starts with prefix, as an index range scan
+
+        Args:
+            prefix (str): Beginning of the source term
+            limit (int): Maximum number of entries
+
+        Returns:
+            List[dict]: Matching entries in source term order
+        """
+        return self._query(f'''
+            SELECT {", ".join(COLUMNS)} FROM terms
+            WHERE source_term >= ? AND source_term < ?
+            ORDER BY source_term, confidence DESC
+            LIMIT ?
+        ''', (prefix, prefix + '\U0010ffff', limit))
+
+    def target_terms(self) -> List[str]:
+        """All distinct target terms, e.g. to seed a segmenter dictionary"""
+        with self._lock:
+            return [row[0] for row in self.conn.execute('SELECT DISTINCT target_term FROM terms')]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """The whole term base, most frequent first"""
+        with self._lock:
+            return pd.read_sql_query(
+                f'SELECT {", ".join(COLUMNS)} FROM terms ORDER BY occurrences DESC, confidence DESC', self.conn
+            )
+
+    def export_to_excel(self, output_path: str) -> None:
+        """Write the whole term base to an Excel file for review"""
+        self.to_dataframe().to_excel(output_path, index=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM terms').fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
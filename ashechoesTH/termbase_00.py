@@ -1,8 +1,9 @@
 import pandas as pd
-from collections import defaultdict
+import numpy as np
 import re
 import openpyxl
 from datetime import datetime
+from substring_miner import mine_substrings
 
 # Create sample Term Base with 10 rows (example terms for technology domain)
 sample_terms = {
@@ -51,28 +52,91 @@ def extract_phrases(text, min_length=2, max_length=6):
     
     return phrases
 
-def analyze_translations(input_file, min_occurrences=3):
-    """Analyze translation file to find consistent phrase pairs"""
-    df = pd.read_excel(input_file)
+def explode_phrases(texts, min_length=2, max_length=6):
+    """
+    extract_phrases for many texts at once, as columnar arrays
+    Returns a DataFrame with the position of the text (row) and each of its phrase windows (phrase)
+    """
+    words = pd.Series(texts, dtype=object).map(str).reset_index(drop=True).str.split(r'[,.\s]+', regex=True).explode().astype('string')
+    following = words.groupby(level=0)
     
-    # Dictionary to store phrase pairs and their frequencies
-    phrase_pairs = defaultdict(int)
+    windows = []
+    phrase = words
+    for n in range(1, max_length + 1):
+        if n > 1:
+            # Append the next word of the same text; windows running past the end become NaN
+            phrase = phrase + ' ' + following.shift(-(n - 1))
+        if n >= min_length:
+            valid = phrase.str.strip().str.len().fillna(0).to_numpy() > 0
+            windows.append(phrase[valid])
     
-    for idx, row in df.iterrows():
-        zh_phrases = extract_phrases(row['Chinese'])
-        th_phrases = extract_phrases(row['Thai'])
+    if not windows:
+        return pd.DataFrame({'row': pd.Series(dtype='int64'), 'phrase': pd.Series(dtype=object)})
+    phrases = pd.concat(windows)
+    return pd.DataFrame({'row': phrases.index.to_numpy(), 'phrase': phrases.to_numpy(dtype=object)})
+
+def read_excel_chunks(input_file, chunk_size=10000, columns=None):
+    """
+    Stream the first sheet of an Excel file as DataFrames of at most chunk_size rows
+    Only the given columns (all if None) are kept, so large exports never load in full
+    """
+    workbook = openpyxl.load_workbook(input_file, read_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        keep = [header.index(col) for col in columns] if columns else list(range(len(header)))
+        chunk = []
+        for row in rows:
+            # Empty cells become NaN, as with pd.read_excel
+            chunk.append([row[i] if i < len(row) and row[i] is not None else np.nan for i in keep])
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=[header[i] for i in keep])
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=[header[i] for i in keep])
+    finally:
+        workbook.close()
+
+def mine_chinese_phrases(texts, min_occurrences=3, min_branching_entropy=0.6):
+    """
+    Repeated Chinese substrings of the whole corpus
+    Returns a DataFrame with the position of each text (row) and every phrase found in it (phrase)
+    """
+    terms = mine_substrings(texts, min_frequency=min_occurrences, min_entropy=min_branching_entropy)
+    phrases = terms[['rows', 'term']].explode('rows').dropna()
+    return pd.DataFrame({'row': phrases['rows'].to_numpy(dtype='int64'), 'phrase': phrases['term'].to_numpy()})
+
+def analyze_translations(input_file, min_occurrences=3, chunk_size=10000):
+    """
+    Analyze translation file to find consistent phrase pairs
+    Phrase pairs are exploded into columns and counted with a group-by, chunk_size rows at a time;
+    the file is streamed twice (Chinese column first, then both columns chunk by chunk)
+    """
+    # Chinese phrases are mined across the corpus instead of enumerated per row
+    chinese = pd.concat(
+        chunk['Chinese'] for chunk in read_excel_chunks(input_file, chunk_size, columns=['Chinese'])
+    )
+    zh_phrases = mine_chinese_phrases(chinese.astype(str).tolist(), min_occurrences)
+    zh_phrases['phrase'] = zh_phrases['phrase'].str.strip()
+    
+    # Count phrase pairs chunk by chunk
+    phrase_pairs = None
+    for chunk_index, chunk in enumerate(read_excel_chunks(input_file, chunk_size, columns=['Thai'])):
+        start = chunk_index * chunk_size
+        th_phrases = explode_phrases(chunk['Thai'].tolist())
+        th_phrases['row'] += start
+        th_phrases['phrase'] = th_phrases['phrase'].str.strip()
         
-        for zh in zh_phrases:
-            for th in th_phrases:
-                phrase_pairs[(zh.strip(), th.strip())] += 1
+        in_chunk = zh_phrases[(zh_phrases['row'] >= start) & (zh_phrases['row'] < start + len(chunk))]
+        pairs = in_chunk.merge(th_phrases, on='row', suffixes=('_zh', '_th'))
+        counts = pairs.groupby(['phrase_zh', 'phrase_th']).size()
+        phrase_pairs = counts if phrase_pairs is None else pd.concat([phrase_pairs, counts]).groupby(level=[0, 1]).sum()
     
     # Filter consistent pairs
-    consistent_pairs = {
-        pair: count for pair, count in phrase_pairs.items()
-        if count >= min_occurrences
-    }
-    
-    return consistent_pairs
+    if phrase_pairs is None:
+        return {}
+    consistent = phrase_pairs[phrase_pairs >= min_occurrences]
+    return {pair: int(count) for pair, count in consistent.items()}
 
 def append_to_termbase(termbase_file, new_pairs):
     """Append new term pairs to existing termbase"""
@@ -1,26 +1,13 @@
 import pandas as pd
 from openpyxl import load_workbook
-import requests
 import json
 from tqdm import tqdm
 import re
 import os
-
-def extract_phrases(text, min_length=2, max_length=6):
-    """
-    Extract phrases from text using basic word count boundaries
-    Returns list of phrases that are between min_length and max_length words
-    """
-    # Split text into words while preserving Chinese characters
-    words = re.findall(r'[\u4e00-\u9fff]+|[^\s]+', text)
-    phrases = []
-    
-    for i in range(len(words)):
-        for j in range(i + min_length, min(i + max_length + 1, len(words) + 1)):
-            phrase = ' '.join(words[i:j])
-            phrases.append(phrase)
-            
-    return phrases
+import numpy as np
+from ollama_client import get_client
+from substring_miner import mine_substrings
+from term_base_store import TermBaseStore
 
 def get_llama_translation(text, source_lang="Chinese", target_lang="Thai"):
     """
@@ -29,46 +16,79 @@ def get_llama_translation(text, source_lang="Chinese", target_lang="Thai"):
     prompt = f"Translate this {source_lang} phrase to {target_lang}: {text}\n\nTranslation:"
     
     try:
-        response = requests.post('http://localhost:11434/api/generate',
-                               json={
-                                   "model": "llama3.2:3b",
-                                   "prompt": prompt,
-                                   "stream": False
-                               })
-        response.raise_for_status()
-        result = response.json()
-        return result['response'].strip()
+        return get_client().generate("llama3.2:3b", prompt)['response'].strip()
     except Exception as e:
         print(f"Error getting translation for '{text}': {str(e)}")
         return None
 
-def create_term_base(input_file, output_file, min_occurrences=2):
+def load_translation_cache(cache_file):
+    """
+    Load phrase translations from previous runs
+    """
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+def save_translation_cache(cache, cache_file):
+    """
+    Persist phrase translations for the next run
+    """
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def translate_phrases(phrases, cache_file="phrase_translation_cache.json"):
+    """
+    Translate each unique phrase once, concurrently, reusing translations cached by earlier runs
+    Returns a dict of phrase -> translation (None where translation failed)
+    """
+    cache = load_translation_cache(cache_file)
+    pending = [phrase for phrase in dict.fromkeys(phrases) if phrase not in cache]
+    print(f"Translating {len(pending)} new phrases ({len(cache)} cached)")
+    
+    try:
+        translations = get_client().map(get_llama_translation, pending)
+        # Failed translations are retried next run
+        cache.update({phrase: t for phrase, t in zip(pending, translations) if t})
+    finally:
+        save_translation_cache(cache, cache_file)
+    
+    return {phrase: cache.get(phrase) for phrase in phrases}
+
+def create_term_base(input_file, store_path, min_occurrences=2, min_branching_entropy=0.6,
+                     cache_file="phrase_translation_cache.json"):
     """
     Create terminology base from translated Excel file
+    Candidate phrases are repeated Chinese substrings mined from the whole source column
+    (see substring_miner), kept when their branching entropy is at least min_branching_entropy.
+    Each phrase is translated once (cached in cache_file), then tested against every row it occurs in.
+    Pairs are upserted into the term base store at store_path (see TermBaseStore).
     """
     # Read input Excel file
     df = pd.read_excel(input_file)
     
-    # Initialize phrase counters
-    phrase_pairs = {}
+    # Discover candidate terms once for the whole corpus
+    print("Mining repeated phrases...")
+    terms = mine_substrings(df.iloc[:, 0].astype(str), min_frequency=min_occurrences, min_entropy=min_branching_entropy)
+    print(f"Found {len(terms)} candidate phrases")
+    
+    # Get a translation suggestion from Llama for every unique phrase
+    translations = translate_phrases(terms['term'].tolist(), cache_file=cache_file)
     
+    # One (phrase, row) entry for each row the phrase occurs in
     print("Analyzing phrases...")
-    for _, row in tqdm(df.iterrows(), total=len(df)):
-        source_text = str(row[0])  # Chinese text
-        target_text = str(row[1])  # Thai text
-        
-        # Extract phrases from source text
-        source_phrases = extract_phrases(source_text)
-        
-        for source_phrase in source_phrases:
-            # Get translation suggestion from Llama
-            suggested_translation = get_llama_translation(source_phrase)
-            
-            if suggested_translation:
-                # If translation appears in target text, count the pair
-                if suggested_translation.lower() in target_text.lower():
-                    pair = (source_phrase, suggested_translation)
-                    phrase_pairs[pair] = phrase_pairs.get(pair, 0) + 1
+    occurrences = terms[['term', 'rows']].explode('rows')
+    occurrences['translation'] = occurrences['term'].map(translations)
+    occurrences = occurrences.dropna(subset=['translation'])
+    occurrences['translation'] = occurrences['translation'].astype(str)  # An empty column would be float
+    target_texts = df.iloc[:, 1].astype(str).str.lower().to_numpy()
+    
+    # If translation appears in target text, count the pair
+    found = np.char.find(
+        target_texts[occurrences['rows'].to_numpy(dtype=int)].astype(str),
+        occurrences['translation'].str.lower().to_numpy().astype(str)
+    ) >= 0
+    phrase_pairs = occurrences[found].groupby(['term', 'translation']).size().to_dict()
     
     # Filter pairs that appear multiple times
     consistent_pairs = {k: v for k, v in phrase_pairs.items() if v >= min_occurrences}
@@ -85,22 +105,22 @@ def create_term_base(input_file, output_file, min_occurrences=2):
     # Sort by occurrence count
     term_base_df = term_base_df.sort_values('Occurrences', ascending=False)
     
-    # Save to Excel
-    if os.path.exists(output_file):
-        # If file exists, append to it
-        with pd.ExcelWriter(output_file, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
-            start_row = writer.sheets['Sheet1'].max_row
-            term_base_df.to_excel(writer, index=False, startrow=start_row)
-    else:
-        # Create new file
-        term_base_df.to_excel(output_file, index=False)
-    
-    print(f"Term base created with {len(term_base_df)} entries")
+    # Merge into the term base store
+    with TermBaseStore(store_path) as store:
+        store.upsert_terms(
+            (source, target, None, occurrences, None)
+            for source, target, occurrences in term_base_df.itertuples(index=False)
+        )
+        print(f"Term base updated with {len(term_base_df)} entries ({len(store)} in total)")
     return term_base_df
 
 # Example usage
 if __name__ == "__main__":
     INPUT_FILE = "translations.xlsx"  # Your input file with translations
-    OUTPUT_FILE = "term_base.xlsx"    # Output term base file
+    STORE_PATH = "term_base.db"       # Term base store, updated in place
+    
+    term_base = create_term_base(INPUT_FILE, STORE_PATH, min_occurrences=2)
     
-    term_base = create_term_base(INPUT_FILE, OUTPUT_FILE, min_occurrences=2)
\ No newline at end of file
+    # Export for review
+    with TermBaseStore(STORE_PATH) as store:
+        store.export_to_excel("term_base.xlsx")
\ No newline at end of file
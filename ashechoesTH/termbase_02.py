@@ -1,11 +1,16 @@
 import pandas as pd
 from openpyxl import load_workbook
-import requests
 import json
 from tqdm import tqdm
 import jieba
 import re
 import os
+import numpy as np
+import scipy.sparse as sp
+from ollama_client import get_client
+from segmentation import Segmenter
+from thai_segmenter import ThaiSegmenter
+from term_base_store import TermBaseStore
 
 def is_valid_term(term):
     """
@@ -45,14 +50,7 @@ Answer these questions:
 Format: JSON with keys: equivalent (boolean), confidence (integer), explanation (string)"""
 
     try:
-        response = requests.post('http://localhost:11434/api/generate',
-                               json={
-                                   "model": "llama2:3b",
-                                   "prompt": prompt,
-                                   "stream": False
-                               })
-        response.raise_for_status()
-        result = response.json()['response']
+        result = get_client().generate("llama2:3b", prompt)['response']
         
         try:
             analysis = json.loads(result)
@@ -67,15 +65,153 @@ Format: JSON with keys: equivalent (boolean), confidence (integer), explanation
         print(f"Error in LLM verification: {str(e)}")
         return {'equivalent': False, 'confidence': 0, 'explanation': str(e)}
 
-def extract_candidate_terms(text, min_length=2, max_length=20):
+def _pair_key(source_term, target_term):
+    """Cache key of a term pair"""
+    return f"{source_term}\t{target_term}"
+
+def _parse_bool(value):
+    """Read a JSON boolean the model may also have written as a string; raise ValueError if it is neither"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'yes'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('false', 'no'):
+        return False
+    raise ValueError(f"Not a boolean: {value!r}")
+
+def _normalize_verdict(verdict):
+    """
+    Coerce an LLM verdict to {'equivalent': bool, 'confidence': int, 'explanation': str}; an unreadable
+    confidence becomes 0. Raises KeyError, TypeError or ValueError when it is not a dict or equivalent
+    is not a boolean.
+    """
+    if not isinstance(verdict, dict):
+        raise TypeError(f"Verdict is not an object: {verdict!r}")
+    try:
+        confidence = int(float(verdict.get('confidence', 0)))
+    except (TypeError, ValueError):
+        confidence = 0
+    return {
+        'equivalent': _parse_bool(verdict['equivalent']),
+        'confidence': confidence,
+        'explanation': str(verdict.get('explanation', ''))
+    }
+
+def load_verification_cache(cache_file):
+    """
+    Load verdicts of previous runs, keyed by source and target term; malformed entries are dropped
+    so those pairs are verified again
+    """
+    cache = {}
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            for key, verdict in json.load(f).items():
+                try:
+                    cache[key] = _normalize_verdict(verdict)
+                except (KeyError, TypeError, ValueError):
+                    continue
+    return cache
+
+def save_verification_cache(cache, cache_file):
+    """
+    Persist verdicts for the next run
+    """
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def get_llm_batch_verification(pairs):
+    """
+    Verify many (source_term, target_term, context) pairs with one LLama call.
+    Returns a dict of pair key -> verdict for every pair the model answered; missing or malformed
+    answers are left out so the caller can fall back to get_llm_verification.
+    """
+    items = [
+        {"id": i, "source": source_term, "target": target_term, "context": context}
+        for i, (source_term, target_term, context) in enumerate(pairs)
+    ]
+    prompt = f"""Task: Verify if each pair of terms are equivalent translations between Chinese and Thai.
+Pairs (JSON array, source is Chinese, target is Thai):
+{json.dumps(items, ensure_ascii=False)}
+
+For every pair answer: are these terms equivalent translations, a confidence score (0-100) and a brief explanation.
+
+Format: a JSON array with one object per pair and keys: id (integer), equivalent (boolean), confidence (integer), explanation (string). Return only the JSON array."""
+
+    try:
+        result = get_client().generate("llama2:3b", prompt, format="json")['response']
+        answers = json.loads(result)
+        if isinstance(answers, dict):
+            # JSON mode may wrap the array in an object
+            answers = next((value for value in answers.values() if isinstance(value, list)), [answers])
+    except Exception as e:
+        print(f"Error in batch LLM verification: {str(e)}")
+        return {}
+    
+    verdicts = {}
+    for answer in answers:
+        try:
+            source_term, target_term, _ = pairs[int(answer['id'])]
+            verdicts[_pair_key(source_term, target_term)] = _normalize_verdict(answer)
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+    return verdicts
+
+def verify_term_pairs(pairs, cache_file="term_verification_cache.json", batch_size=25):
+    """
+    Verify (source_term, target_term, context) pairs in batches of batch_size per prompt.
+    Pairs are deduplicated first and verdicts are cached in cache_file, so only pairs never seen
+    before are sent to the LLM. Returns a dict of pair key -> verdict.
+    """
+    cache = load_verification_cache(cache_file)
+    
+    # First occurrence of each unique pair, keeping only those not verified yet
+    unique_pairs = {}
+    for source_term, target_term, context in pairs:
+        unique_pairs.setdefault(_pair_key(source_term, target_term), (source_term, target_term, context))
+    pending = [pair for key, pair in unique_pairs.items() if key not in cache]
+    print(f"{len(unique_pairs) - len(pending)} of {len(unique_pairs)} unique pairs already verified, "
+          f"verifying {len(pending)} new pairs")
+    
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    
+    def _verify_batch(batch):
+        verdicts = get_llm_batch_verification(batch)
+        for source_term, target_term, context in batch:
+            key = _pair_key(source_term, target_term)
+            if key not in verdicts:
+                verdict = get_llm_verification(source_term, target_term, context)
+                try:
+                    verdicts[key] = _normalize_verdict(verdict)
+                except (KeyError, TypeError, ValueError):
+                    # Not cached (confidence 0), so it is verified again next run
+                    verdicts[key] = {'equivalent': False, 'confidence': 0, 'explanation': f"Malformed verdict: {verdict}"}
+        return verdicts
+    
+    try:
+        for verdicts in tqdm(get_client().map(_verify_batch, batches), total=len(batches)):
+            # Failed verifications (confidence 0) are retried next run
+            cache.update({key: verdict for key, verdict in verdicts.items() if verdict.get('confidence')})
+    finally:
+        save_verification_cache(cache, cache_file)
+    
+    return {
+        _pair_key(source_term, target_term): cache.get(
+            _pair_key(source_term, target_term),
+            {'equivalent': False, 'confidence': 0, 'explanation': 'not verified'}
+        )
+        for source_term, target_term, _ in pairs
+    }
+
+def extract_candidate_terms(text, min_length=2, max_length=20, segments=None):
     """
     Extract potential terms from text
+    segments is the text's segmentation when already known (Segmenter for Chinese, ThaiSegmenter for Thai)
     Returns a list of valid terms
     """
     # Check if text contains Chinese characters
     if re.search(r'[\u4e00-\u9fff]', text):
         # Use jieba for Chinese text
-        terms = list(jieba.cut(text, cut_all=False))
+        terms = segments if segments is not None else list(jieba.cut(text, cut_all=False))
         
         # Get combinations of terms
         combined_terms = []
@@ -95,8 +231,21 @@ def extract_candidate_terms(text, min_length=2, max_length=20):
     
     # For Thai text
     elif re.search(r'[\u0e00-\u0e7f]', text):
-        # Split by spaces and common Thai delimiters
-        basic_terms = re.findall(r'\S+', text)
+        if segments is not None:
+            # Dictionary words from ThaiSegmenter; words split by whitespace are joined back with a space
+            basic_terms, joiners = [], []
+            separator = ''
+            for token in segments:
+                if token.isspace():
+                    separator = ' '
+                else:
+                    basic_terms.append(token)
+                    joiners.append(separator)
+                    separator = ''
+        else:
+            # Split by spaces and common Thai delimiters
+            basic_terms = re.findall(r'\S+', text)
+            joiners = [' '] * len(basic_terms)
         
         combined_terms = []
         for i in range(len(basic_terms)):
@@ -107,7 +256,7 @@ def extract_candidate_terms(text, min_length=2, max_length=20):
             # Try combining with next terms
             current_combo = current_term
             for j in range(i + 1, min(i + 3, len(basic_terms))):
-                current_combo = ' '.join([current_combo, basic_terms[j]])
+                current_combo = joiners[j].join([current_combo, basic_terms[j]])
                 if len(current_combo) <= max_length and is_valid_term(current_combo):
                     combined_terms.append(current_combo)
         
@@ -115,10 +264,97 @@ def extract_candidate_terms(text, min_length=2, max_length=20):
     
     return []
 
-def create_term_base(input_file, output_file, confidence_threshold=70):
+def _incidence_matrix(candidates_per_row):
+    """
+    Binary row × term sparse matrix of which candidate terms occur in which row.
+    Returns the matrix and the term vocabulary.
+    """
+    exploded = pd.Series(candidates_per_row, dtype=object).explode().dropna()
+    codes, vocabulary = pd.factorize(exploded)
+    matrix = sp.csr_matrix(
+        (np.ones(len(codes), dtype=np.float64), (exploded.index.to_numpy(), codes)),
+        shape=(len(candidates_per_row), len(vocabulary))
+    )
+    matrix.data[:] = 1  # Duplicate candidates in a row count once
+    return matrix, vocabulary
+
+def score_candidate_pairs(source_candidates, target_candidates, min_cooccurrence=2):
+    """
+    Score every co-occurring (source term, target term) pair over the whole corpus at once.
+    Co-occurrence counts come from one sparse matrix product; each pair gets Dice, PMI and
+    signed log-likelihood ratio (G², negative when the pair co-occurs less than chance) association
+    scores. Returns a DataFrame with the row-level matrices
+    attached as attrs so callers can look up example rows.
+    """
+    source_matrix, source_vocabulary = _incidence_matrix(source_candidates)
+    target_matrix, target_vocabulary = _incidence_matrix(target_candidates)
+    total_rows = source_matrix.shape[0]
+    
+    cooccurrence = (source_matrix.T @ target_matrix).tocoo()
+    keep = cooccurrence.data >= min_cooccurrence
+    source_index, target_index = cooccurrence.row[keep], cooccurrence.col[keep]
+    
+    k11 = cooccurrence.data[keep]
+    source_freq = np.asarray(source_matrix.sum(axis=0)).ravel()[source_index]
+    target_freq = np.asarray(target_matrix.sum(axis=0)).ravel()[target_index]
+    
+    # 2×2 contingency table of each pair: both, source only, target only, neither
+    observed = [k11, source_freq - k11, target_freq - k11, total_rows - source_freq - target_freq + k11]
+    expected = [
+        source_freq * target_freq / total_rows,
+        source_freq * (total_rows - target_freq) / total_rows,
+        (total_rows - source_freq) * target_freq / total_rows,
+        (total_rows - source_freq) * (total_rows - target_freq) / total_rows,
+    ]
+    llr = 2 * sum(
+        np.where(o > 0, o * np.log(np.where(o > 0, o, 1) / np.where(e > 0, e, 1)), 0)
+        for o, e in zip(observed, expected)
+    )
+    llr = np.where(k11 > expected[0], llr, -llr)
+    
+    scores = pd.DataFrame({
+        'source_term': source_vocabulary[source_index],
+        'target_term': target_vocabulary[target_index],
+        'cooccurrence': k11.astype(int),
+        'dice': 2 * k11 / (source_freq + target_freq),
+        'pmi': np.log(k11 * total_rows / (source_freq * target_freq)),
+        'llr': llr,
+    })
+    scores.attrs['source_matrix'] = source_matrix
+    scores.attrs['target_matrix'] = target_matrix
+    scores.attrs['source_index'] = pd.Index(source_vocabulary)
+    scores.attrs['target_index'] = pd.Index(target_vocabulary)
+    return scores
+
+def select_aligned_pairs(scores, top_k=3, score='llr'):
+    """Keep the top_k best-associated target terms for each source term, among pairs that co-occur more than chance"""
+    ranked = scores[scores['pmi'] > 0].sort_values(['source_term', score], ascending=[True, False])
+    return ranked.groupby('source_term', sort=False).head(top_k).reset_index(drop=True)
+
+def _example_row(scores, source_term, target_term):
+    """Index of the first row where both terms occur, for the verification context"""
+    source_column = scores.attrs['source_matrix'][:, scores.attrs['source_index'].get_loc(source_term)]
+    target_column = scores.attrs['target_matrix'][:, scores.attrs['target_index'].get_loc(target_term)]
+    return source_column.multiply(target_column).nonzero()[0].min()
+
+def create_term_base(input_file, store, confidence_threshold=70, top_k=3, min_cooccurrence=2,
+                     cache_file="term_verification_cache.json", batch_size=25, segmenter=None, thai_segmenter=None):
     """
-    Create terminology base using LLM verification
+    Create terminology base using LLM verification.
+    Candidate pairs are first aligned statistically over the whole corpus; only the top_k pairs
+    per source term (by log-likelihood ratio) are sent to the LLM verifier, batch_size pairs per
+    prompt, with verdicts cached in cache_file across runs. Chinese text is segmented by segmenter
+    (a default Segmenter if None), which caches segmentations and runs on all cores. Thai text is split
+    into dictionary words by thai_segmenter (the base Thai word list plus the term base store if None).
+    Verified pairs are upserted into store: an open TermBaseStore, left open for the caller, or the
+    path of one to open and close here.
     """
+    if not isinstance(store, TermBaseStore):
+        # Own the store for this call only, closing it however the run ends
+        with TermBaseStore(store) as opened:
+            return create_term_base(input_file, opened, confidence_threshold, top_k, min_cooccurrence,
+                                    cache_file, batch_size, segmenter, thai_segmenter)
+    
     # Read input Excel file
     try:
         df = pd.read_excel(input_file)
@@ -126,47 +362,52 @@ def create_term_base(input_file, output_file, confidence_threshold=70):
         print(f"Error reading input file: {str(e)}")
         return None
     
-    # Initialize term base entries
-    term_base_entries = []
+    source_texts = df.iloc[:, 0].astype(str).tolist()  # Chinese text
+    target_texts = df.iloc[:, 1].astype(str).tolist()  # Thai text
     
-    print("Processing translations...")
-    for idx, row in tqdm(df.iterrows(), total=len(df)):
-        try:
-            source_text = str(row[0])  # Chinese text
-            target_text = str(row[1])  # Thai text
-            
-            # Extract candidate terms from both source and target
-            source_candidates = extract_candidate_terms(source_text)
-            target_candidates = extract_candidate_terms(target_text)
-            
-            # Cross-verify promising pairs
-            for source_term in source_candidates:
-                for target_term in target_candidates:
-                    # Skip very short or very long terms
-                    if len(source_term) < 2 or len(target_term) < 2:
-                        continue
-                    if len(source_term) > 20 or len(target_term) > 20:
-                        continue
-                    
-                    # Use LLM to verify the pair
-                    verification = get_llm_verification(
-                        source_term, 
-                        target_term,
-                        context=f"From translation pair: {source_text} → {target_text}"
-                    )
-                    
-                    # If confident enough, add to term base
-                    if (verification['equivalent'] and 
-                        verification['confidence'] >= confidence_threshold):
-                        term_base_entries.append({
-                            'Source (Chinese)': source_term,
-                            'Target (Thai)': target_term,
-                            'Confidence': verification['confidence'],
-                            'Explanation': verification['explanation']
-                        })
-        except Exception as e:
-            print(f"Error processing row {idx}: {str(e)}")
-            continue
+    # Extract candidate terms from both source and target, skipping very short or very long terms
+    print("Segmenting source texts...")
+    segmenter = segmenter or Segmenter()
+    source_segments = segmenter.segment_all(source_texts)
+    
+    print("Segmenting target texts...")
+    thai_segmenter = thai_segmenter or ThaiSegmenter.from_terms(store.target_terms())
+    target_segments = thai_segmenter.segment_all(target_texts)
+    
+    print("Extracting candidate terms...")
+    def _candidates(text, segments=None):
+        return [term for term in extract_candidate_terms(text, segments=segments) if 2 <= len(term) <= 20]
+    source_candidates = [_candidates(text, segments) for text, segments in tqdm(zip(source_texts, source_segments), total=len(source_texts))]
+    target_candidates = [_candidates(text, segments) for text, segments in tqdm(zip(target_texts, target_segments), total=len(target_texts))]
+    
+    # Align candidates statistically and keep only the most promising pairs
+    scores = score_candidate_pairs(source_candidates, target_candidates, min_cooccurrence=min_cooccurrence)
+    aligned_pairs = select_aligned_pairs(scores, top_k=top_k)
+    naive_pairs = sum(len(s) * len(t) for s, t in zip(source_candidates, target_candidates))
+    print(f"Verifying {len(aligned_pairs)} aligned pairs instead of {naive_pairs} row-level pairs")
+    
+    # Verify all pairs in batches, reusing cached verdicts
+    pairs = []
+    for pair in aligned_pairs.itertuples(index=False):
+        row = _example_row(scores, pair.source_term, pair.target_term)
+        pairs.append((pair.source_term, pair.target_term,
+                      f"From translation pair: {source_texts[row]} → {target_texts[row]}"))
+    verdicts = verify_term_pairs(pairs, cache_file=cache_file, batch_size=batch_size)
+    
+    # Keep pairs the LLM is confident enough about
+    term_base_entries = []
+    for pair in aligned_pairs.itertuples(index=False):
+        verification = verdicts[_pair_key(pair.source_term, pair.target_term)]
+        if (verification.get('equivalent') and 
+            verification.get('confidence', 0) >= confidence_threshold):
+            term_base_entries.append({
+                'Source (Chinese)': pair.source_term,
+                'Target (Thai)': pair.target_term,
+                'Confidence': verification['confidence'],
+                'Explanation': verification['explanation'],
+                'Co-occurrences': pair.cooccurrence,
+                'LLR': round(pair.llr, 2)
+            })
     
     # Create term base DataFrame
     if not term_base_entries:
@@ -179,18 +420,14 @@ def create_term_base(input_file, output_file, confidence_threshold=70):
     term_base_df = term_base_df.sort_values('Confidence', ascending=False)
     term_base_df = term_base_df.drop_duplicates(subset=['Source (Chinese)', 'Target (Thai)'])
     
-    # Save to Excel
+    # Merge into the term base store
     try:
-        if os.path.exists(output_file):
-            # If file exists, append to it
-            with pd.ExcelWriter(output_file, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
-                start_row = writer.sheets['Sheet1'].max_row
-                term_base_df.to_excel(writer, index=False, startrow=start_row)
-        else:
-            # Create new file
-            term_base_df.to_excel(output_file, index=False)
+        store.upsert_terms(
+            (row['Source (Chinese)'], row['Target (Thai)'], row['Confidence'], row['Co-occurrences'], row['Explanation'])
+            for row in term_base_df.to_dict('records')
+        )
         
-        print(f"Term base created with {len(term_base_df)} entries")
+        print(f"Term base updated with {len(term_base_df)} entries ({len(store)} in total)")
         return term_base_df
     except Exception as e:
         print(f"Error saving term base: {str(e)}")
@@ -199,14 +436,19 @@ def create_term_base(input_file, output_file, confidence_threshold=70):
 # Example usage
 if __name__ == "__main__":
     INPUT_FILE = "translations.xlsx"
-    OUTPUT_FILE = "term_base.xlsx"
+    STORE_PATH = "term_base.db"
     
-    # Add custom terms to jieba
-    jieba.add_word("同调者收集")
-    jieba.add_word("เอคโคแมนเซอร์")
+    # Custom terms are built into the segmentation dictionary once
+    segmenter = Segmenter(custom_words=["同调者收集"])
     
-    term_base = create_term_base(
-        INPUT_FILE, 
-        OUTPUT_FILE, 
-        confidence_threshold=70
-    )
\ No newline at end of file
+    with TermBaseStore(STORE_PATH) as store:
+        # Thai words come from the base word list, the existing term base and custom terms
+        thai_segmenter = ThaiSegmenter.from_terms(store.target_terms(), extra_words=["เอคโคแมนเซอร์"])
+        
+        term_base = create_term_base(
+            INPUT_FILE, 
+            store, 
+            confidence_threshold=70,
+            segmenter=segmenter,
+            thai_segmenter=thai_segmenter
+        )
\ No newline at end of file
@@ -0,0 +1,44 @@
+import re
+from typing import List, Optional, Tuple
+
+# Everything the translators must pass through untouched, as one alternation so a single
+# scan masks it all: existing sentinels, [..] tags, <..> rich-text markup, escaped and real
+# newlines, {0}/{name} format args and printf-style args
+PROTECTED_PATTERN = re.compile(
+    r'⟦\d+⟧'
+    r'|\[[^\[\]\n]*\]'
+    r'|<[^<>\n]*>'
+    r'|\\n|\r?\n'
+    r'|\{[A-Za-z0-9_]*(?::[^{}]*)?\}'
+    r'|%(?:\d+\$)?[sd]'
+)
+SENTINEL_PATTERN = re.compile(r'⟦(\d+)⟧')
+
+# Prompt rule to pair with masked text
+PLACEHOLDER_RULE = "Keep every placeholder such as ⟦0⟧ exactly as is and in the right position."
+
+def protect(text: str, spans: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+    """
+    Replace every protected span with a compact ⟦n⟧ sentinel in one pass.
+    Identical spans share a sentinel; pass the spans of a previous call to number
+    related texts (e.g. Chinese and English source) consistently.
+    """
+    spans = [] if spans is None else spans
+    index = {span: i for i, span in enumerate(spans)}
+
+    def _mask(match):
+        span = match.group(0)
+        if span not in index:
+            index[span] = len(spans)
+            spans.append(span)
+        return f'⟦{index[span]}⟧'
+
+    return PROTECTED_PATTERN.sub(_mask, text), spans
+
+def restore(text: str, spans: List[str]) -> str:
+    """Put the protected spans back in one pass, leaving unknown sentinels as they are"""
+    def _unmask(match):
+        i = int(match.group(1))
+        return spans[i] if i < len(spans) else match.group(0)
+
+    return SENTINEL_PATTERN.sub(_unmask, text)
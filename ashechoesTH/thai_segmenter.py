@@ -0,0 +1,156 @@
+import os
+import re
+from array import array
+from typing import Iterable, List
+
+import pandas as pd
+
+# Runs of non-Thai text (spaces, Latin, digits, punctuation) are kept as single tokens
+NON_THAI_PATTERN = re.compile(r'(\s+|[^\u0e00-\u0e7f\s]+)')
+# Vowels, tone marks and signs that attach to the preceding character; no token starts with one
+ATTACHED_PATTERN = re.compile(r'[\u0e30-\u0e3a\u0e45-\u0e4e]')
+LEADING_VOWELS = '\u0e40\u0e41\u0e42\u0e43\u0e44'  # เ แ โ ใ ไ, written before their consonant
+# Consonant pairs pronounced as one onset (ห/อ leading, true clusters); a leading vowel binds both
+ONSET_PAIR_PATTERN = re.compile(r'ห[งญนมยรลว]|อย|[กขคตปพ][รลว]')
+# A consonant silenced by ์ (with a second silent consonant or vowel before the mark) ends the previous syllable
+SILENT_PATTERN = re.compile(r'[\u0e01-\u0e2e]{1,2}[\u0e34\u0e38]?\u0e4c')
+
+def cluster_boundaries(text: str) -> List[bool]:
+    """
+    For every position 0..len(text), whether a token may start or end there: never inside a character
+    cluster, i.e. before an attached vowel or mark, after a leading vowel or inside its onset pair,
+    or before a silent consonant.
+    """
+    n = len(text)
+    valid = [True] * (n + 1)
+    for i in range(1, n):
+        if (ATTACHED_PATTERN.match(text[i]) or text[i - 1] in LEADING_VOWELS
+                or (i >= 2 and text[i - 2] in LEADING_VOWELS and ONSET_PAIR_PATTERN.match(text, i - 1))
+                or SILENT_PATTERN.match(text, i)):
+            valid[i] = False
+    return valid
+# Common Thai and game UI words shipped with the segmenter, one per line; a fuller list can be passed instead
+BASE_WORDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thai_words.txt')
+
+def load_words(words_file: str = BASE_WORDS_FILE) -> List[str]:
+    """Read a word list, one word per line; a missing file gives no words"""
+    if not words_file or not os.path.exists(words_file):
+        return []
+    with open(words_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+class ThaiSegmenter:
+    def __init__(self, words: Iterable[str] = ()):
+        """
+        Dictionary-driven Thai maximal-matching segmenter.
+        Words are stored in a compact trie: one character-to-child dict per node and a byte array of
+        word-end flags. Each Thai run is segmented into the fewest dictionary words, with as few
+        unknown characters as possible; unknown characters between words are kept together as one token.
+        Tokens only start and end on character cluster boundaries, so a dictionary word inside an
+        unknown one cannot split it into unpronounceable fragments.
+        """
+        self._children = [{}]
+        self._terminal = array('b', [0])
+        self.size = 0
+        self.add_words(words)
+
+    @classmethod
+    def from_terms(cls, terms: Iterable[str], extra_words: Iterable[str] = (),
+                   words_file: str = BASE_WORDS_FILE) -> 'ThaiSegmenter':
+        """
+        Seed the dictionary with the base word list in words_file, then Thai term base entries and their
+        space-separated parts, so a fresh term base still splits Thai runs into words
+        """
+        terms = pd.Series(list(terms), dtype=object).dropna().astype(str).str.strip()
+        words = load_words(words_file) + list(extra_words) + terms.tolist() + terms.str.split().explode().dropna().tolist()
+        return cls(words)
+
+    def add_words(self, words: Iterable[str]) -> None:
+        """Add words to the dictionary"""
+        for word in words:
+            word = word.strip()
+            if not word or ' ' in word:
+                continue
+            node = 0
+            for char in word:
+                child = self._children[node].get(char)
+                if child is None:
+                    child = len(self._children)
+                    self._children[node][char] = child
+                    self._children.append({})
+                    self._terminal.append(0)
+                node = child
+            if not self._terminal[node]:
+                self._terminal[node] = 1
+                self.size += 1
+
+    def _word_ends(self, text: str, start: int) -> List[int]:
+        """End positions of all dictionary words starting at start"""
+        ends = []
+        node = 0
+        children, terminal = self._children, self._terminal
+        for i in range(start, len(text)):
+            node = children[node].get(text[i])
+            if node is None:
+                break
+            if terminal[node]:
+                ends.append(i + 1)
+        return ends
+
+    def _segment_thai(self, text: str) -> List[str]:
+        """Maximal matching over one run of Thai characters"""
+        n = len(text)
+        boundaries = cluster_boundaries(text)
+        # best[i] = (unknown characters, tokens, previous position, is word) of the best segmentation of text[:i]
+        best = [None] * (n + 1)
+        best[0] = (0, 0, -1, True)
+        for i in range(n):
+            if best[i] is None:
+                continue
+            unknown, tokens, _, _ = best[i]
+            for end in self._word_ends(text, i):
+                if not boundaries[end]:
+                    continue
+                candidate = (unknown, tokens + 1, i, True)
+                if best[end] is None or candidate[:2] < best[end][:2]:
+                    best[end] = candidate
+            # Skip one unknown character cluster
+            end = i + 1
+            while not boundaries[end]:
+                end += 1
+            candidate = (unknown + end - i, tokens + 1, i, False)
+            if best[end] is None or candidate[:2] < best[end][:2]:
+                best[end] = candidate
+
+        # Walk back, merging adjacent unknown spans
+        tokens = []
+        end = n
+        merge = False
+        while end > 0:
+            _, _, start, is_word = best[end]
+            if merge and not is_word:
+                tokens[-1] = text[start:end] + tokens[-1]
+            else:
+                tokens.append(text[start:end])
+            merge = not is_word
+            end = start
+        tokens.reverse()
+        return tokens
+
+    def segment(self, text: str) -> List[str]:
+        """Segment text into words; non-Thai runs, including whitespace, stay as their own tokens"""
+        tokens = []
+        for part in NON_THAI_PATTERN.split(text):
+            if not part:
+                continue
+            if NON_THAI_PATTERN.fullmatch(part):
+                tokens.append(part)
+            else:
+                tokens.extend(self._segment_thai(part))
+        return tokens
+
+    def segment_all(self, texts: Iterable[str]) -> List[List[str]]:
+        """Segment a corpus, each unique text once"""
+        texts = list(texts)
+        segments = {text: self.segment(text) for text in dict.fromkeys(texts)}
+        return [segments[text] for text in texts]
@@ -1,61 +1,14 @@
 import pandas as pd
-import requests
 import json
 from pathlib import Path
-import time
 import re
+from text_protection import protect, restore, PLACEHOLDER_RULE
+from ollama_client import get_client, make_output_validator
+from usage_ledger import UsageLedger
 
-def preserve_special_chars(text):
-    """
-    Extract and preserve tags and newlines before translation
-    """
-    # Create placeholders for tags and newlines
-    square_brackets = []
-    angle_brackets = []
-    newlines = []
-    
-    # Extract tags and newlines
-    square_pattern = r'\[.*?\]'
-    angle_pattern = r'<.*?>'
-    newline_pattern = r'\\n'
-    
-    # Save square brackets
-    square_matches = re.finditer(square_pattern, text)
-    for i, match in enumerate(square_matches):
-        square_brackets.append(match.group())
-        text = text.replace(match.group(), f'[SQUARETAG{i}]')
-    
-    # Save angle brackets
-    angle_matches = re.finditer(angle_pattern, text)
-    for i, match in enumerate(angle_matches):
-        angle_brackets.append(match.group())
-        text = text.replace(match.group(), f'<ANGLETAG{i}>')
-    
-    # Save newlines
-    newline_matches = re.finditer(newline_pattern, text)
-    for i, match in enumerate(newline_matches):
-        newlines.append(match.group())
-        text = text.replace(match.group(), f'NEWLINE{i}')
-    
-    return text, square_brackets, angle_brackets, newlines
-
-def restore_special_chars(text, square_brackets, angle_brackets, newlines):
-    """
-    Restore tags and newlines after translation
-    """
-    # Restore square brackets
-    for i, tag in enumerate(square_brackets):
-        text = text.replace(f'[SQUARETAG{i}]', tag)
-    
-    # Restore angle brackets
-    for i, tag in enumerate(angle_brackets):
-        text = text.replace(f'<ANGLETAG{i}>', tag)
-    
-    # Restore newlines
-    for i, newline in enumerate(newlines):
-        text = text.replace(f'NEWLINE{i}', '\\n')
-    
-    return text
+# Token usage of every Ollama call, persisted across runs
+ledger = UsageLedger(label='allcell_excel_C_toEN')
+get_client().ledger = ledger
 
 def post_process_translation(text):
     """
@@ -84,29 +37,18 @@ def translate_text(text, model="qwen2.5:3b"):
     text = str(text)
     
     # Preserve special characters
-    preserved_text, square_brackets, angle_brackets, newlines = preserve_special_chars(text)
+    preserved_text, spans = protect(text)
     
     # Prepare the prompt
-    prompt = f"Translate the following text to English. Keep all formatting and spacing exactly as is. Return only translated text, no comment, no instruction, no additional context, nothing else: {preserved_text}"
-    
-    # Ollama API endpoint
-    url = "http://localhost:11434/api/generate"
-    
-    # Request payload
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False
-    }
+    prompt = f"Translate the following text to English. Keep all formatting and spacing exactly as is. {PLACEHOLDER_RULE} Return only translated text, no comment, no instruction, no additional context, nothing else: {preserved_text}"
     
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        translated_text = result['response'].strip()
+        # Stream and abort early on Chinese residue, explanations or runaway output
+        validator = make_output_validator(preserved_text, check_english_preamble=False)
+        translated_text = get_client().generate_validated(model, prompt, validator)['response'].strip()
         
         # Restore special characters
-        final_text = restore_special_chars(translated_text, square_brackets, angle_brackets, newlines)
+        final_text = restore(translated_text, spans)
         
         # Post-process to ensure proper newline handling
         final_text = post_process_translation(final_text)
@@ -141,34 +83,29 @@ def translate_excel(input_path, output_path, model="qwen2.5:3b"):
         # Get the name of the third column
         third_column = df.columns[2]
         
-        # Initialize progress tracking
-        total_cells = len(df)
-        processed_cells = 0
-        
-        # Process only the third column
+        # Process only the third column, as many cells at once as the Ollama server runs in parallel
         print("Translating third column (column C) contents...")
-        for idx in df.index:
-            cell_value = df.iloc[idx, 2]  # Access third column by index 2
-            if isinstance(cell_value, (str, int, float)):
-                # Translate the text
-                translated_text = translate_text(cell_value, model)
-                # Validate and fix if necessary
-                translated_text = validate_translation(translated_text)
-                df.iloc[idx, 2] = translated_text
-                
-            # Update progress
-            processed_cells += 1
-            if processed_cells % 10 == 0:  # Show progress every 10 cells
-                progress = (processed_cells / total_cells) * 100
-                print(f"Progress: {progress:.1f}% ({processed_cells}/{total_cells} cells)")
-            
-            # Add a small delay to prevent overwhelming the API
-            time.sleep(0.1)
+        cells = df.iloc[:, 2]  # Access third column by index 2
+        to_translate = cells[cells.map(lambda cell_value: isinstance(cell_value, (str, int, float)))]
+        
+        sheet = Path(input_path).name
+        
+        def _translate_cell(item):
+            row, cell_value = item
+            ledger.set_context(sheet=sheet, row=row)
+            # Translate the text, then validate and fix if necessary
+            return validate_translation(translate_text(cell_value, model))
+        
+        translated = get_client().map(_translate_cell, to_translate.items())
+        df[third_column] = df[third_column].astype(object)
+        df.loc[to_translate.index, third_column] = translated
+        print(f"Translated {len(translated)}/{len(df)} cells")
         
         # Save the translated file
         print(f"Saving translated file to: {output_path}")
         df.to_excel(output_path, index=False)
         print("Translation completed successfully!")
+        ledger.print_report()
         
         return True
     
@@ -182,17 +119,17 @@ def main():
     output_file = "output_EN.xlsx"
     
     # Ensure Ollama is running and the model is available
-    try:
-        # Check if model exists
-        response = requests.post("http://localhost:11434/api/show", 
-                               json={"name": "qwen2.5:3b"})
-        if response.status_code != 200:
-            print("Please ensure the qwen2.5:3b model is pulled in Ollama.")
-            print("Run: 'ollama pull qwen2.5:3b' first.")
-            return
-    except requests.exceptions.ConnectionError:
+    client = get_client()
+    if not client.health_check():
         print("Error: Cannot connect to Ollama. Please ensure Ollama is running.")
         return
+    if not client.has_model("qwen2.5:3b"):
+        print("Please ensure the qwen2.5:3b model is pulled in Ollama.")
+        print("Run: 'ollama pull qwen2.5:3b' first.")
+        return
+    
+    # Load the model before the first real request
+    client.warmup("qwen2.5:3b")
     
     # Translate the file
     if Path(input_file).exists():
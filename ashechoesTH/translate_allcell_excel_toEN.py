@@ -1,8 +1,13 @@
 import pandas as pd
-import requests
 import json
 from pathlib import Path
-import time
+from cell_mask import classify_cells, unique_sources, scatter_translations, first_rows
+from ollama_client import get_client
+from usage_ledger import UsageLedger
+
+# Token usage of every Ollama call, persisted across runs
+ledger = UsageLedger(label='allcell_excel_toEN')
+get_client().ledger = ledger
 
 def translate_text(text, model="qwen2.5:3b"):
     """
@@ -17,21 +22,8 @@ def translate_text(text, model="qwen2.5:3b"):
     # Prepare the prompt
     prompt = f"Translate the following text to English, Return only translated text, no comment, no instruction, no additioncal context, nothing else: {text}"
     
-    # Ollama API endpoint
-    url = "http://localhost:11434/api/generate"
-    
-    # Request payload
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False
-    }
-    
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        return result['response'].strip()
+        return get_client().generate(model, prompt)['response'].strip()
     except Exception as e:
         print(f"Translation error for text '{text}': {str(e)}")
         return text
@@ -53,31 +45,30 @@ def translate_excel(input_path, output_path, model="qwen2.5:3b"):
         translated_columns = [translate_text(col, model) for col in original_columns]
         df.columns = translated_columns
         
-        # Initialize progress tracking
-        total_cells = df.size
-        processed_cells = 0
+        # Classify all cells at once and translate each unique string once
+        mask, text = classify_cells(df)
+        sources = unique_sources(mask, text)
+        print(f"Translating {len(sources)} unique strings from {int(mask.to_numpy().sum())} of {df.size} cells...")
+        
+        # As many requests at once as the Ollama server runs in parallel; each call is billed to the
+        # first row holding the string
+        sheet = Path(input_path).name
+        rows = first_rows(mask, text)
+        
+        def _translate_source(source):
+            ledger.set_context(sheet=sheet, row=rows[source])
+            return translate_text(source, model)
         
-        # Process each cell in the DataFrame
-        print("Translating cell contents...")
-        for column in df.columns:
-            for idx in df.index:
-                cell_value = df.at[idx, column]
-                if isinstance(cell_value, (str, int, float)):
-                    df.at[idx, column] = translate_text(cell_value, model)
-                    
-                # Update progress
-                processed_cells += 1
-                if processed_cells % 10 == 0:  # Show progress every 10 cells
-                    progress = (processed_cells / total_cells) * 100
-                    print(f"Progress: {progress:.1f}% ({processed_cells}/{total_cells} cells)")
-                
-                # Add a small delay to prevent overwhelming the API
-                time.sleep(0.1)
+        translations = dict(zip(sources, get_client().map(_translate_source, sources)))
+        
+        # Write all translations back in bulk
+        df = scatter_translations(df, mask, text, translations)
         
         # Save the translated file
         print(f"Saving translated file to: {output_path}")
         df.to_excel(output_path, index=False)
         print("Translation completed successfully!")
+        ledger.print_report()
         
         return True
     
@@ -91,17 +82,17 @@ def main():
     output_file = "output_EN.xlsx"
     
     # Ensure Ollama is running and the model is available
-    try:
-        # Check if model exists
-        response = requests.post("http://localhost:11434/api/show", 
-                               json={"name": "qwen2.5:3b"})
-        if response.status_code != 200:
-            print("Please ensure the qwen2.5:3b model is pulled in Ollama.")
-            print("Run: 'ollama pull qwen2.5:3b' first.")
-            return
-    except requests.exceptions.ConnectionError:
+    client = get_client()
+    if not client.health_check():
         print("Error: Cannot connect to Ollama. Please ensure Ollama is running.")
         return
+    if not client.has_model("qwen2.5:3b"):
+        print("Please ensure the qwen2.5:3b model is pulled in Ollama.")
+        print("Run: 'ollama pull qwen2.5:3b' first.")
+        return
+    
+    # Load the model before the first real request
+    client.warmup("qwen2.5:3b")
     
     # Translate the file
     if Path(input_file).exists():
@@ -1,49 +1,26 @@
+import os
 import pandas as pd
-import requests
-import time
-import re
 from typing import Optional
+from text_protection import protect, restore, PLACEHOLDER_RULE
+from ollama_client import get_client, make_output_validator
+from usage_ledger import UsageLedger
 
-def preserve_special_content(text: str) -> tuple[str, list, list, list]:
-    """
-    Extract and preserve content within brackets and tags
-    """
-    # Store original special content
-    square_brackets = re.findall(r'\[.*?\]', text)
-    angle_brackets = re.findall(r'<.*?>', text)
-    newlines = re.findall(r'\\n', text)
-    
-    # Replace with placeholders
-    text = re.sub(r'\[.*?\]', '[BRACKET]', text)
-    text = re.sub(r'<.*?>', '<TAG>', text)
-    text = re.sub(r'\\n', 'NEWLINE', text)
-    
-    return text, square_brackets, angle_brackets, newlines
-
-def restore_special_content(text: str, square_brackets: list, angle_brackets: list, newlines: list) -> str:
-    """
-    Restore preserved content back into the translated text
-    """
-    for bracket in square_brackets:
-        text = text.replace('[BRACKET]', bracket, 1)
-    for tag in angle_brackets:
-        text = text.replace('<TAG>', tag, 1)
-    for newline in newlines:
-        text = text.replace('NEWLINE', '\\n', 1)
-    return text
+# Token usage of every Ollama call, persisted across runs
+ledger = UsageLedger(label='translate_zh-th_01')
+get_client().ledger = ledger
 
-def translate_text(text: str, api_url: str = "http://localhost:11434/api/generate") -> Optional[str]:
+def translate_text(text: str) -> Optional[str]:
     """
     Localize text from Chinese to Thai using Ollama API while preserving special content
     """
     # Preserve special content before translation
-    modified_text, square_brackets, angle_brackets, newlines = preserve_special_content(text)
+    modified_text, spans = protect(text)
     
     prompt = f"""As a professional Thai localizer, localize the following Chinese text to Thai. 
     Make sure the translation is natural and culturally appropriate for Thai audience.
     
     Rules:
-    1. Keep formatting elements exactly as is: [BRACKET], <TAG>, and NEWLINE
+    1. {PLACEHOLDER_RULE}
     2. Ensure the Thai text flows naturally
     3. Consider Thai cultural context
     4. Maintain the original meaning and tone
@@ -53,19 +30,12 @@ def translate_text(text: str, api_url: str = "http://localhost:11434/api/generat
     {modified_text}"""
     
     try:
-        response = requests.post(
-            api_url,
-            json={
-                "model": "llama3.2:3b",
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        response.raise_for_status()
-        translated_text = response.json()["response"].strip()
+        # Stream and abort early on Chinese residue, explanations or runaway output
+        validator = make_output_validator(modified_text)
+        translated_text = get_client().generate_validated("llama3.2:3b", prompt, validator)["response"].strip()
         
         # Restore special content in the translated text
-        final_text = restore_special_content(translated_text, square_brackets, angle_brackets, newlines)
+        final_text = restore(translated_text, spans)
         return final_text
     except Exception as e:
         print(f"Error localizing text: {str(e)}")
@@ -86,21 +56,30 @@ def translate_excel_file(input_file: str, output_file: str, source_col: str = 'C
         target_column = df.columns[ord(target_col.upper()) - ord('A')] if len(df.columns) > ord(target_col.upper()) - ord('A') else target_col
         df[target_column] = ""
         
-        # Translate each cell
-        total_rows = len(df)
-        for idx, row in df.iterrows():
-            source_text = str(row[source_column])
-            if source_text and source_text.strip():
-                print(f"Localizing row {idx + 1} of {total_rows}...")
-                translation = translate_text(source_text)
-                if translation:
-                    df.at[idx, target_column] = translation
-                # Add a small delay to avoid overwhelming the API
-                time.sleep(1)
+        # Localize each unique non-empty cell, as many at once as the Ollama server runs in parallel
+        source_texts = df[source_column].astype(str)
+        source_texts = source_texts[source_texts.str.strip() != ""]
+        first_rows = source_texts.drop_duplicates()
+        unique_texts = first_rows.tolist()
+        print(f"Localizing {len(unique_texts)} unique texts from {len(source_texts)} rows...")
+        sheet = os.path.basename(input_file)
+        
+        def _translate_row(item):
+            # Each call is billed to the first row holding the text
+            row, text = item
+            ledger.set_context(sheet=sheet, row=row)
+            return translate_text(text)
+        
+        translations = dict(zip(unique_texts, get_client().map(_translate_row, first_rows.items())))
+        
+        translated = source_texts.map(translations)
+        translated = translated[translated.notna()]
+        df.loc[translated.index, target_column] = translated
         
         # Save the translated file
         df.to_excel(output_file, index=False)
         print(f"Localization completed. Output saved to {output_file}")
+        ledger.print_report()
         
     except Exception as e:
         print(f"Error processing Excel file: {str(e)}")
@@ -5,6 +5,15 @@ import os
 from datetime import datetime
 import anthropic
 import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from cell_mask import classify_cells, unique_sources, scatter_translations, first_rows
+from usage_ledger import UsageLedger
+
+def _count_sheet_cells(training_file: str, sheet_name: str) -> Counter:
+    """Read one sheet and count its non-empty stripped cell values (runs in a worker process)"""
+    values = pd.read_excel(training_file, sheet_name=sheet_name).stack().dropna().astype(str).str.strip()
+    return Counter({value: int(count) for value, count in values[values != ""].value_counts().items()})
 
 class TranslationSystem:
     def __init__(self, api_key: str):
@@ -12,67 +21,54 @@ class TranslationSystem:
         self.client = anthropic.Client(api_key=api_key)
         self.translation_memory = {}
         self.term_base = {}
+        self.term_counts = Counter()  # Frequency of each term kept in the term base
+        self.ledger = UsageLedger(label='allcell_v01')  # Token usage per call, persisted across runs
         
-    def build_translation_assets(self, training_file: str) -> None:
-        """Build translation memory and term base from training data"""
+    def build_translation_assets(self, training_file: str, min_term_frequency: int = 2, max_workers: int = None) -> None:
+        """
+        Build translation memory and term base from training data in one pass.
+        Sheets are read and counted in parallel processes; n-grams are enumerated once per unique cell,
+        weighted by its count, and only terms seen at least min_term_frequency times are kept.
+        """
         print("Building translation assets...")
         
-        # Read all sheets from training file
-        xlsx = pd.ExcelFile(training_file)
+        sheet_names = pd.ExcelFile(training_file).sheet_names
         
-        # Dictionary to track term frequencies and translations
-        term_candidates = {}
+        # Count cell values of all sheets concurrently
+        cell_counts = Counter()
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for counts in executor.map(_count_sheet_cells, [training_file] * len(sheet_names), sheet_names):
+                cell_counts.update(counts)
         
-        # Process each sheet
-        for sheet_name in xlsx.sheet_names:
-            df = pd.read_excel(xlsx, sheet_name=sheet_name)
-            
-            # Process all cells in the sheet
-            for col in df.columns:
-                for idx, cell_value in df[col].items():
-                    source = str(cell_value).strip()
-                    
-                    # Skip invalid entries
-                    if pd.isna(source) or not source:
-                        continue
-                        
-                    # Process each valid cell for translation memory and term base
-                    if source in self.translation_memory:
-                        self.translation_memory[source]['frequency'] += 1
-                    else:
-                        self.translation_memory[source] = {
-                            'target': '',  # Will be filled during translation
-                            'frequency': 1,
-                            'alternatives': set()
-                        }
-                    
-                    # Process terms for term base
-                    words = source.split()
-                    for n in range(1, min(5, len(words) + 1)):
-                        for i in range(len(words) - n + 1):
-                            term = ' '.join(words[i:i+n])
-                            
-                            if len(term) < 2:
-                                continue
-                                
-                            if term not in term_candidates:
-                                term_candidates[term] = {
-                                    'translations': {},
-                                    'frequency': 0
-                                }
-                            
-                            term_candidates[term]['frequency'] += 1
-        
-        # Build term base with criteria
-        for term, data in term_candidates.items():
-            if (data['frequency'] >= 1 and 
-                1 <= len(term) <= 500 and
-                len(term.split()) <= 80):
-                
-                self.term_base[term] = ''  # Will be filled during translation
+        # Translation memory: one entry per unique cell
+        for source, frequency in cell_counts.items():
+            if source in self.translation_memory:
+                self.translation_memory[source]['frequency'] += frequency
+            else:
+                self.translation_memory[source] = {
+                    'target': '',  # Will be filled during translation
+                    'frequency': frequency,
+                    'alternatives': set()
+                }
+        
+        # Count 1-4 word terms once per unique cell, weighted by how often the cell occurs
+        term_counts = Counter()
+        for source, frequency in cell_counts.items():
+            words = source.split()
+            for n in range(1, min(5, len(words) + 1)):
+                for i in range(len(words) - n + 1):
+                    term = ' '.join(words[i:i+n])
+                    if 2 <= len(term) <= 500:
+                        term_counts[term] += frequency
+        
+        # Keep only frequent terms
+        self.term_counts = Counter({term: count for term, count in term_counts.items() if count >= min_term_frequency})
+        for term in self.term_counts:
+            self.term_base.setdefault(term, '')  # Will be filled during translation
         
         print(f"Built translation memory with {len(self.translation_memory)} entries")
-        print(f"Built term base with {len(self.term_base)} entries")
+        print(f"Built term base with {len(self.term_base)} entries "
+              f"({len(term_counts) - len(self.term_counts)} terms below frequency {min_term_frequency} dropped)")
 
     def save_assets(self, output_dir: str) -> None:
         """Save translation memory and term base to files"""
@@ -90,6 +86,10 @@ class TranslationSystem:
             
         with open(os.path.join(output_dir, 'term_base.json'), 'w', encoding='utf-8') as f:
             json.dump(self.term_base, f, ensure_ascii=False, indent=2)
+        
+        # Term counts only matter to the builder, store them without indentation
+        with open(os.path.join(output_dir, 'term_counts.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.term_counts, f, ensure_ascii=False, separators=(',', ':'))
     
     def load_assets(self, input_dir: str) -> None:
         """Load translation memory and term base from files"""
@@ -104,6 +104,11 @@ class TranslationSystem:
             
         with open(os.path.join(input_dir, 'term_base.json'), 'r', encoding='utf-8') as f:
             self.term_base = json.load(f)
+        
+        term_counts_file = os.path.join(input_dir, 'term_counts.json')
+        if os.path.exists(term_counts_file):
+            with open(term_counts_file, 'r', encoding='utf-8') as f:
+                self.term_counts = Counter(json.load(f))
     
     def _create_context(self, source_text: str) -> str:
         """Create context for Claude using translation memory and term base"""
@@ -170,6 +175,7 @@ Please maintain consistency with the provided translations while ensuring natura
                 {"role": "user", "content": prompt}
             ]
         )
+        self.ledger.record_anthropic(message)
         
         translation = message.content[0].text
         
@@ -179,72 +185,82 @@ Please maintain consistency with the provided translations while ensuring natura
         
         return translation
     
-    def translate_file(self, input_file: str, output_file: str, source_lang: str, target_lang: str) -> None:
-        """Translate an Excel file including all sheets and cells"""
+    def _translate_unique(self, sources: List[str], source_lang: str, target_lang: str, max_workers: int,
+                          locations: Dict[str, Tuple[str, int]] = None) -> Dict[str, str]:
+        """
+        Translate each unique source string once, concurrently, and remember every result.
+        locations maps a string to the (sheet, row) its usage is recorded against.
+        """
+        translations = {}
+        locations = locations or {}
+        
+        def _translate(source_text):
+            sheet, row = locations.get(source_text, (None, None))
+            self.ledger.set_context(sheet=sheet, row=row)
+            try:
+                return self.translate_text(source_text, source_lang, target_lang)
+            except Exception as e:
+                print(f"Error translating '{source_text}': {str(e)}")
+                return f"ERROR: {str(e)}"
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_translate, source): source for source in sources}
+            for done, future in enumerate(as_completed(futures), start=1):
+                translations[futures[future]] = future.result()
+                if done % 10 == 0:
+                    print(f"Progress: {done}/{len(sources)} unique strings ({done / len(sources) * 100:.1f}%)")
+        
+        # Fill the memory for every translated string, not only those seen in training data
+        for source, translation in translations.items():
+            if translation.startswith("ERROR: "):
+                continue
+            entry = self.translation_memory.setdefault(source, {'target': '', 'frequency': 0, 'alternatives': set()})
+            entry['target'] = translation
+        
+        return translations
+    
+    def translate_file(self, input_file: str, output_file: str, source_lang: str, target_lang: str, max_workers: int = 8) -> None:
+        """
+        Translate an Excel file including all sheets and cells.
+        Plans the work across all sheets first, so each unique string is translated once.
+        """
         print(f"Translating {input_file}...")
         
-        # Read input file
-        xlsx = pd.ExcelFile(input_file)
+        # Read all sheets at once
+        sheets = pd.read_excel(input_file, sheet_name=None)
+        
+        # Classify cells of each sheet in one vectorized pass, then collect unique strings across all sheets
+        classified = {sheet_name: classify_cells(df) for sheet_name, df in sheets.items()}
+        unique_strings = list(dict.fromkeys(
+            source for mask, text in classified.values() for source in unique_sources(mask, text)
+        ))
+        total_cells = sum(df.size for df in sheets.values())
+        translatable_cells = sum(int(mask.to_numpy().sum()) for mask, _ in classified.values())
+        print(f"Found {len(unique_strings)} unique strings in {translatable_cells} translatable cells "
+              f"({total_cells - translatable_cells} empty or numeric skipped) across {len(sheets)} sheets")
+        
+        # Record each string's calls against the first sheet and row holding it
+        locations = {}
+        for sheet_name, (mask, text) in classified.items():
+            for source, row in first_rows(mask, text).items():
+                locations.setdefault(source, (sheet_name, row))
+        
+        translations = self._translate_unique(unique_strings, source_lang, target_lang, max_workers, locations)
+        
+        def _apply_translations(sheet_name):
+            mask, text = classified[sheet_name]
+            return scatter_translations(sheets[sheet_name], mask, text, translations)
+        
+        # Build translated sheets in parallel; openpyxl writes one workbook from a single thread
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            translated_sheets = dict(zip(sheets, executor.map(_apply_translations, sheets)))
         
-        # Create Excel writer for output
         with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-            # Process each sheet
-            for sheet_name in xlsx.sheet_names:
-                print(f"\nProcessing sheet: {sheet_name}")
-                
-                # Read the sheet
-                df = pd.read_excel(xlsx, sheet_name=sheet_name)
-                
-                # Create output DataFrame
-                df_out = df.copy()
-                
-                # Get total number of cells for progress tracking
-                total_cells = df.size
-                processed_cells = 0
-                skipped_cells = 0
-                
-                # Translate each cell in the sheet
-                for col in df.columns:
-                    for idx, cell_value in df[col].items():
-                        # Check for empty cells first - multiple conditions for emptiness
-                        if (pd.isna(cell_value) or  # Check for NaN
-                            cell_value == "" or     # Empty string
-                            str(cell_value).strip() == ""): # Whitespace only
-                            df_out.at[idx, col] = cell_value  # Keep original empty value
-                            processed_cells += 1
-                            skipped_cells += 1
-                            continue
-                        
-                        source_text = str(cell_value).strip()
-                        
-                        # Skip if cell contains only numbers
-                        if str(cell_value).replace('.', '').replace('-', '').isdigit():
-                            df_out.at[idx, col] = cell_value
-                            processed_cells += 1
-                            skipped_cells += 1
-                            continue
-                        
-                        # Translate and store result
-                        try:
-                            translation = self.translate_text(source_text, source_lang, target_lang)
-                            df_out.at[idx, col] = translation
-                        except Exception as e:
-                            print(f"Error translating cell [{idx}, {col}]: {str(e)}")
-                            df_out.at[idx, col] = f"ERROR: {str(e)}"
-                        
-                        processed_cells += 1
-                        
-                        # Show progress every 10 cells
-                        if processed_cells % 10 == 0:
-                            progress = (processed_cells / total_cells) * 100
-                            print(f"Progress: {processed_cells}/{total_cells} cells ({progress:.1f}%)")
-                            print(f"Skipped {skipped_cells} empty or numeric cells")
-                
-                # Save the translated sheet
+            for sheet_name, df_out in translated_sheets.items():
                 df_out.to_excel(writer, sheet_name=sheet_name, index=False)
                 
         print(f"Translation completed. Output saved to {output_file}")
-        print(f"Total empty or numeric cells skipped: {skipped_cells}")
+        self.ledger.print_report()
 
 def main():
     # Configuration
@@ -3,6 +3,9 @@ import openai
 from typing import Dict
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from text_protection import PROTECTED_PATTERN
+from usage_ledger import UsageLedger
 
 class TranslationSystem:
     def __init__(self, api_key: str):
@@ -10,6 +13,7 @@ class TranslationSystem:
         self.api_key = api_key
         self.translation_memory = {}
         self.term_base = {}
+        self.ledger = UsageLedger(label='fullsystem_v4_openai')  # Token usage per call, persisted across runs
         
     def build_translation_assets(self, training_file: str) -> None:
         """
@@ -69,6 +73,7 @@ class TranslationSystem:
                       {"role": "user", "content": prompt}]
         )
         
+        self.ledger.record_openai(response)
         translated_text = response.choices[0].message.content.strip()
 
         # If translation still contains Chinese, retry with a decremented retry counter
@@ -86,7 +91,9 @@ class TranslationSystem:
         localized_count = 0
         completed_rows = 0
         
+        sheet = os.path.basename(input_file)
         for idx, row in df.iterrows():
+            self.ledger.set_context(sheet=sheet, row=idx)
             if pd.notna(row.iloc[3]) and str(row.iloc[3]).strip():
                 completed_rows += 1
                 continue  # Skip rows with existing localized text
@@ -115,25 +122,62 @@ class TranslationSystem:
         df.to_excel(output_file, index=False)
         print("Translation complete. Output saved to:", output_file)
         
-        self.perform_lqa(df, output_file)
+        self.perform_lqa(df, output_file, sheet=sheet)
+        self.ledger.print_report()
     
-    def perform_lqa(self, df, output_file: str):
-        """Perform Localization Quality Assurance (LQA) after translation with progress tracking."""
+    def run_lqa_checks(self, df) -> pd.DataFrame:
+        """
+        Run all LQA checks over the whole frame at once.
+        Returns a defect table with one boolean column per check, holding only failing rows.
+        """
+        zh = df.iloc[:, 1].fillna("").astype(str).str.strip()
+        en = df.iloc[:, 2].fillna("").astype(str).str.strip()
+        th = df.iloc[:, 3].fillna("").astype(str).str.strip()
+        
+        has_source = (zh != "") | (en != "")
+        # Compare length against English where available, it is closest in length to Thai;
+        # tags against the Chinese that was translated, falling back to English
+        source = en.where(en != "", zh)
+        tag_source = zh.where(zh != "", en)
+        source_len = source.str.len()
+        length_ratio = th.str.len() / source_len.where(source_len > 0)
+        
+        checks = pd.DataFrame({
+            'missing_text': has_source & (th == ""),
+            'cjk_residue': th.str.contains(r'[\u4e00-\u9fff]'),
+            'tag_mismatch': tag_source.str.count(PROTECTED_PATTERN.pattern) != th.str.count(PROTECTED_PATTERN.pattern),
+            'length_ratio': (source_len >= 10) & (th != "") & ((length_ratio < 0.25) | (length_ratio > 4.0)),
+            'trailing_period': th.str.contains(r'(?<!\.)\.$'),
+            'untranslated_english': (th != "") & ~th.str.contains(r'[\u0e00-\u0e7f]') & th.str.contains(r'[A-Za-z]{3,}'),
+        })
+        checks = checks[has_source & checks.any(axis=1)]
+        checks.insert(0, 'defects', checks.dot(checks.columns + ", ").str.rstrip(", "))
+        return checks
+    
+    def perform_lqa(self, df, output_file: str, max_workers: int = 8, sheet: str = None):
+        """Perform Localization Quality Assurance (LQA) and re-translate only the failing rows concurrently."""
         print("Performing LQA checks...")
-        total_rows = len(df)
-        checked_rows = 0
+        defects = self.run_lqa_checks(df)
+        print(f"LQA found {len(defects)} failing rows out of {len(df)}")
         
-        for idx, row in df.iterrows():
-            zh_text = str(row.iloc[1]).strip() if pd.notna(row.iloc[1]) else ""
-            translated_text = str(row.iloc[3]).strip() if pd.notna(row.iloc[3]) else ""
+        if len(defects):
+            defect_file = f"{os.path.splitext(output_file)[0]}_lqa_defects.xlsx"
+            defects.join(df.iloc[:, 1:4]).to_excel(defect_file)
+            print(f"Saved LQA defect table to: {defect_file}")
+            
+            zh = df.iloc[:, 1].fillna("").astype(str).str.strip()
+            en = df.iloc[:, 2].fillna("").astype(str).str.strip()
+            
+            def _retranslate(idx):
+                self.ledger.set_context(sheet=sheet, row=idx)
+                return self.translate_text(zh.at[idx], en.at[idx])
             
-            if zh_text and not translated_text:
-                print(f"Warning: Missing translation at row {idx}. Retrying...")
-                df.at[idx, df.columns[3]] = self.translate_text(zh_text, row.iloc[2])
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                retranslated = list(executor.map(_retranslate, defects.index))
+            df.loc[defects.index, df.columns[3]] = retranslated
             
-            checked_rows += 1
-            progress = (checked_rows / total_rows) * 100
-            print(f"LQA Progress: {progress:.2f}% completed")
+            remaining = self.run_lqa_checks(df.loc[defects.index])
+            print(f"Re-translated {len(defects)} rows, {len(remaining)} still fail LQA")
         
         df.to_excel(output_file, index=False)
         print("LQA complete. Final output saved to:", output_file)
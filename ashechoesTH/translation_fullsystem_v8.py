@@ -6,11 +6,62 @@ import re
 import json
 import time
 from collections import defaultdict
+from text_protection import protect, restore, PLACEHOLDER_RULE
+from usage_ledger import UsageLedger
+
+# Providers only cache prompt prefixes of at least this many tokens; the auto-sized glossary fills
+# the invariant prefix up to PREFIX_TARGET_TOKENS to stay clear of the limit
+MIN_CACHED_PREFIX_TOKENS = 1024
+PREFIX_TARGET_TOKENS = 1400
+
+def estimate_tokens(text: str) -> int:
+    """Rough, low-side token count: about 4 ASCII characters per token, 3 other characters (Chinese, Thai) per token"""
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) // 3
+
+# Matches "X【Y】" style terms: base term X with a bracketed modifier Y
+BRACKET_PATTERN = r'([^【】]+)【([^【】]+)】'
+
+# Invariant prompt parts. They go first and never change between calls, so providers that cache
+# prompt prefixes bill and process them at the cached rate; per-row material goes last.
+SYSTEM_PROMPT = "You are a professional Thai game localizer, responsible for accurately adapting in-game text from Chinese and/or English into Thai while maintaining the intended tone, style, and context within the game's world. Your translations must reflect the nuances of game terminology, character personalities, lore, and genre conventions to ensure a seamless player experience. CONSISTENCY IS CRITICAL - use the same translations for recurring terms. Do remove . at the end of sentence, as it's not Thai. Leave \n or any markdown as it is."
+
+STATIC_INSTRUCTIONS = f"""
+Translate the in-game text given at the end into Thai, ensuring it accurately reflects the tone, style, and meaning while maintaining a natural reading experience.
+
+**Localization Rules:**
+- Prioritize **game-specific terminology** from established translations where available.
+- Adapt cultural references appropriately for Thai players while preserving the original intent.
+- Maintain consistency in naming conventions, character dialogue styles, and tone.
+- **Do not transliterate** names unless necessary, prefer localized naming conventions.
+- Ensure commands, UI texts, and short labels are concise and intuitive.
+- Avoid unnecessary punctuation, and do **not** end sentences with a period (".") unless grammatically required.
+- **IMPORTANT**: Every single Chinese character MUST be translated. If a character or phrase has no meaningful translation, provide the Thai pronunciation instead.
+- **CRITICAL FOR CONSISTENCY**: Always follow the glossary and the terminology and pattern translations provided in the context section.
+- {PLACEHOLDER_RULE}
+
+**Translation Priorities:**
+1. **Use the English source if both Chinese and English are available**, as it may provide clearer context.
+2. If **English is missing**, rely on the Chinese text for meaning.
+3. If a character or term has no meaning or is unfamiliar, provide the Thai phonetic pronunciation instead of leaving Chinese characters.
+4. **MAINTAIN CONSISTENCY** with previously translated terms, especially for game-specific terminology.
+
+Provide only the final localized Thai text, with no Chinese characters, and no additional comments.
+"""
 
 class TranslationSystem:
-    def __init__(self, api_key: str, training_file: str, input_file: str, output_file: str, save_interval: int = 100):
-        """Initialize translation system with OpenAI's GPT-4o-mini"""
+    def __init__(self, api_key: str, training_file: str, input_file: str, output_file: str, save_interval: int = 100,
+                 glossary_size: int = None, client=None):
+        """
+        Initialize translation system with OpenAI's GPT-4o-mini.
+        glossary_size: number of top terms to put in the cached prompt prefix (0 disables the block); None sizes
+            the glossary so the prefix reaches PREFIX_TARGET_TOKENS, enough for the provider to cache it
+        client: OpenAI-compatible client, e.g. a local stub; defaults to openai.Client
+        """
         self.api_key = api_key
+        self.client = client if client is not None else openai.Client(api_key=api_key)
+        self.glossary_size = glossary_size
+        self._prompt_prefix = None  # Cached invariant system prompt, rebuilt when the glossary changes
         self.training_file = training_file
         self.input_file = input_file
         self.output_file = output_file
@@ -20,6 +71,8 @@ class TranslationSystem:
         self.training_data_buffer = []
         self.consistent_terms = {}  # Store terms that must be translated consistently
         self.session_translations = {}  # Store translations from current session
+        self.bracket_terms = {}  # Precomputed X【Y】 decompositions keyed by Chinese source text
+        self.ledger = UsageLedger(label='fullsystem_v8')  # Token usage per call, persisted across runs
         
     def build_translation_assets(self):
         """
@@ -152,6 +205,7 @@ class TranslationSystem:
         print(f"Built translation memory with {len(self.translation_memory)} entries")
         print(f"Built term base with {len(self.term_base)} entries")
         print(f"Built consistency rules for {len(self.consistent_terms)} terms")
+        self._prompt_prefix = None
     
     def _create_context(self, zh_text: str, en_text: str) -> str:
         """Create context for translation using translation memory and term base"""
@@ -239,10 +293,9 @@ class TranslationSystem:
             self.session_translations[zh_text] = th_text
             
             # Extract potential key terms (like parts in brackets)
-            bracket_terms = re.findall(r'([^【】]+)【([^【】]+)】', zh_text)
-            for base_term, modifier in bracket_terms:
-                if base_term.strip():
-                    self.session_translations[base_term.strip()] = th_text.split('【')[0].strip()
+            for base_term, modifier in self.get_bracket_terms(zh_text):
+                if base_term:
+                    self.session_translations[base_term] = th_text.split('【')[0].strip()
     
     def save_training_data_buffer(self):
         """Save accumulated translations from buffer to training data file."""
@@ -281,31 +334,96 @@ class TranslationSystem:
         except Exception as e:
             print(f"Error saving training data: {str(e)}")
 
-    def analyze_patterns(self, df):
-        """Analyze the input data for patterns and build consistency rules."""
+    def precompute_source_columns(self, df):
+        """
+        Extract the source columns and all X【Y】 decompositions for the whole sheet in one vectorized pass.
+        Returns (source, matches): source has zh_text/en_text per row, matches has one row per bracket match.
+        """
+        source = pd.DataFrame({
+            'zh_text': df.iloc[:, 1].fillna("").astype(str).str.strip(),  # Column B
+            'en_text': df.iloc[:, 2].fillna("").astype(str).str.strip(),  # Column C
+        })
+        
+        matches = source['zh_text'].str.extractall(BRACKET_PATTERN)
+        matches.columns = ['base_term', 'modifier']
+        matches['base_term'] = matches['base_term'].str.strip()
+        matches['modifier'] = matches['modifier'].str.strip()
+        matches['zh_text'] = source['zh_text'].reindex(matches.index.get_level_values(0)).to_numpy()
+        
+        # Cache decompositions by source text so translate_text/update_training_data skip the regex;
+        # a repeated text is decomposed from its first row only
+        first_rows = source.index[~source['zh_text'].duplicated()]
+        unique_matches = matches[matches.index.get_level_values(0).isin(first_rows)]
+        self.bracket_terms = {
+            zh_text: list(zip(group['base_term'], group['modifier']))
+            for zh_text, group in unique_matches.groupby('zh_text', sort=False)
+        }
+        return source, matches
+    
+    def get_bracket_terms(self, zh_text: str) -> List[Tuple[str, str]]:
+        """Return the stripped (base_term, modifier) pairs of a source text, from cache when precomputed"""
+        if zh_text in self.bracket_terms:
+            return self.bracket_terms[zh_text]
+        return [(base.strip(), modifier.strip()) for base, modifier in re.findall(BRACKET_PATTERN, zh_text or "")]
+
+    def analyze_patterns(self, matches):
+        """Analyze the precomputed bracket matches for patterns and build consistency rules."""
         print("Analyzing patterns for consistency rules...")
         
         # Find recurring patterns like "X【Y】" format that might need consistent translation
-        bracket_patterns = defaultdict(list)
-        
-        for idx in range(len(df)):
-            zh_text = str(df.iloc[idx, 1]).strip() if pd.notna(df.iloc[idx, 1]) else ""
-            
-            # Find patterns with brackets
-            matches = re.findall(r'([^【】]+)【([^【】]+)】', zh_text)
-            for base_term, modifier in matches:
-                if base_term.strip():
-                    bracket_patterns[base_term.strip()].append(modifier.strip())
+        bracket_patterns = matches.loc[matches['base_term'] != "", 'base_term'].value_counts(sort=False)
         
         # Add recurring base terms to consistency dictionary
-        for base_term, modifiers in bracket_patterns.items():
-            if len(modifiers) >= 2:  # If the base term appears multiple times with different modifiers
-                print(f"Found recurring pattern: '{base_term}【...】' appears {len(modifiers)} times")
-                # We'll enforce consistency for these in the translation process
-                if base_term in self.translation_memory:
-                    self.consistent_terms[base_term] = self.translation_memory[base_term]['target']
+        for base_term, count in bracket_patterns[bracket_patterns >= 2].items():
+            # The base term appears multiple times with different modifiers
+            print(f"Found recurring pattern: '{base_term}【...】' appears {count} times")
+            # We'll enforce consistency for these in the translation process
+            if base_term in self.translation_memory:
+                self.consistent_terms[base_term] = self.translation_memory[base_term]['target']
         
         print(f"Added {len(bracket_patterns)} pattern-based consistency rules")
+        self._prompt_prefix = None
+
+    def build_prompt_prefix(self) -> str:
+        """
+        Build the invariant system prompt: role, rules and a glossary of the most frequent consistent terms,
+        followed by the most frequent translation memory entries when sizing automatically.
+        The glossary is ordered deterministically so the prefix stays byte-identical across calls.
+        """
+        if self._prompt_prefix is None:
+            parts = [SYSTEM_PROMPT, STATIC_INSTRUCTIONS]
+            if self.glossary_size != 0:
+                def _frequency(term):
+                    return -self.translation_memory.get(term, {}).get('frequency', 0), term
+                
+                entries = [(term, self.consistent_terms[term]) for term in sorted(self.consistent_terms, key=_frequency)]
+                if self.glossary_size is None:
+                    # Repeated translation memory entries are just as stable across calls
+                    entries += [
+                        (term, self.translation_memory[term]['target'])
+                        for term in sorted(self.translation_memory, key=_frequency)
+                        if term not in self.consistent_terms and self.translation_memory[term]['frequency'] >= 2
+                    ]
+                    tokens = estimate_tokens("\n".join(parts))
+                    limit = 0
+                    for term, target in entries:
+                        if tokens >= PREFIX_TARGET_TOKENS:
+                            break
+                        tokens += estimate_tokens(f"'{term}' → '{target}'\n")
+                        limit += 1
+                    entries = entries[:limit]
+                else:
+                    entries = entries[:self.glossary_size]
+                if entries:
+                    parts.append("**GLOSSARY (MANDATORY):**")
+                    parts.extend(f"'{term}' → '{target}'" for term, target in entries)
+            self._prompt_prefix = "\n".join(parts)
+            
+            prefix_tokens = estimate_tokens(self._prompt_prefix)
+            if prefix_tokens < MIN_CACHED_PREFIX_TOKENS:
+                print(f"Warning: prompt prefix is about {prefix_tokens} tokens, below the "
+                      f"{MIN_CACHED_PREFIX_TOKENS}-token minimum for prompt caching")
+        return self._prompt_prefix
 
     def translate_text(self, zh_text: str, en_text: str, retries=3) -> str:
         """Translate text using OpenAI GPT-4o-mini with contextual integration, limiting retries"""
@@ -320,10 +438,9 @@ class TranslationSystem:
             return self.consistent_terms[zh_text]
         
         # Check for patterns with brackets that need consistent translation
-        bracket_match = re.search(r'([^【】]+)【([^【】]+)】', zh_text)
-        if bracket_match:
-            base_term = bracket_match.group(1).strip()
-            modifier = bracket_match.group(2).strip()
+        bracket_terms = self.get_bracket_terms(zh_text)
+        if bracket_terms:
+            base_term, modifier = bracket_terms[0]
             
             # If we have a consistent translation for the base term
             if base_term in self.consistent_terms:
@@ -351,43 +468,26 @@ class TranslationSystem:
         
         # Create context for translation
         context = self._create_context(zh_text, en_text)
+        
+        # Mask tags, newlines and format args; both sources share one sentinel numbering
+        masked_zh, spans = protect(zh_text) if zh_text else (zh_text, [])
+        masked_en, spans = protect(en_text, spans) if en_text else (en_text, spans)
 
-        prompt = f"""
-        Translate the following in-game text into Thai, ensuring it accurately reflects the tone, style, and meaning while maintaining a natural reading experience.
-        
-        **Localization Rules:**
-        - Prioritize **game-specific terminology** from established translations where available.
-        - Adapt cultural references appropriately for Thai players while preserving the original intent.
-        - Maintain consistency in naming conventions, character dialogue styles, and tone.
-        - **Do not transliterate** names unless necessary, prefer localized naming conventions.
-        - Ensure commands, UI texts, and short labels are concise and intuitive.
-        - Avoid unnecessary punctuation, and do **not** end sentences with a period (".") unless grammatically required.
-        - **IMPORTANT**: Every single Chinese character MUST be translated. If a character or phrase has no meaningful translation, provide the Thai pronunciation instead.
-        - **CRITICAL FOR CONSISTENCY**: Always follow the terminology and pattern translations provided in the context section.
-        
-        **Translation Context:**
-        {context}
-        
-        **Translation Priorities:**
-        1. **Use the English source if both Chinese and English are available**, as it may provide clearer context.
-        2. If **English is missing**, rely on the Chinese text for meaning.
-        3. If a character or term has no meaning or is unfamiliar, provide the Thai phonetic pronunciation instead of leaving Chinese characters.
-        4. **MAINTAIN CONSISTENCY** with previously translated terms, especially for game-specific terminology.
-        
-        Chinese Source: {zh_text if zh_text else 'N/A'}
-        English Source: {en_text if en_text else 'N/A'}
-        
-        Provide only the final localized Thai text, with no Chinese characters, and no additional comments.
-        """
+        # Per-row material only; everything invariant lives in the cached system prefix
+        prompt = f"""**Translation Context:**
+{context}
+
+Chinese Source: {masked_zh if masked_zh else 'N/A'}
+English Source: {masked_en if masked_en else 'N/A'}"""
         
-        client = openai.Client(api_key=self.api_key)
-        response = client.chat.completions.create(
+        response = self.client.chat.completions.create(
             model="gpt-4o-mini",
-            messages=[{"role": "system", "content": "You are a professional Thai game localizer, responsible for accurately adapting in-game text from Chinese and/or English into Thai while maintaining the intended tone, style, and context within the game's world. Your translations must reflect the nuances of game terminology, character personalities, lore, and genre conventions to ensure a seamless player experience. CONSISTENCY IS CRITICAL - use the same translations for recurring terms. Do remove . at the end of sentence, as it's not Thai. Leave \n or any markdown as it is."},
+            messages=[{"role": "system", "content": self.build_prompt_prefix()},
                       {"role": "user", "content": prompt}]
         )
         
-        translated_text = response.choices[0].message.content.strip()
+        self.ledger.record_openai(response)
+        translated_text = restore(response.choices[0].message.content.strip(), spans)
         
         # If translation still contains Chinese, retry with a decremented retry counter
         if self.contains_chinese(translated_text):
@@ -406,13 +506,13 @@ class TranslationSystem:
             return self.translation_memory[modifier]['target']
         
         # If not, get a quick translation for just the modifier
-        client = openai.Client(api_key=self.api_key)
-        response = client.chat.completions.create(
+        response = self.client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "system", "content": "You are a professional Thai game localizer. Translate this term accurately and concisely."},
                       {"role": "user", "content": f"Translate only this term to Thai: {modifier}"}]
         )
         
+        self.ledger.record_openai(response)
         translated_modifier = response.choices[0].message.content.strip()
         return translated_modifier
     
@@ -438,8 +538,11 @@ class TranslationSystem:
             for i, col in enumerate(df.columns):
                 print(f"Column {i}: {col}")
                 
+            # Extract source text and bracket terms once for the whole sheet
+            source, matches = self.precompute_source_columns(df)
+                
             # Analyze patterns in the input data to build consistency rules
-            self.analyze_patterns(df)
+            self.analyze_patterns(matches)
                 
         except Exception as e:
             print(f"Error reading input file: {str(e)}")
@@ -460,26 +563,16 @@ class TranslationSystem:
         
         # Do a first pass to extract and pre-translate common terms
         print("First pass: Identifying repeating terms for consistent translation...")
-        term_counts = defaultdict(int)
-        
-        for idx in range(len(df)):
-            zh_text = str(df.iloc[idx, 1]).strip() if pd.notna(df.iloc[idx, 1]) else ""
-            if not zh_text:
-                continue
-                
-            # Count occurrences of terms
-            term_counts[zh_text] += 1
-            
-            # Look for bracket patterns
-            matches = re.findall(r'([^【】]+)【([^【】]+)】', zh_text)
-            for base_term, _ in matches:
-                if base_term.strip():
-                    term_counts[base_term.strip()] += 1
+        # Count occurrences of full source texts and of bracket base terms together
+        term_counts = pd.concat([
+            source.loc[source['zh_text'] != "", 'zh_text'],
+            matches.loc[matches['base_term'] != "", 'base_term'],
+        ], ignore_index=True).value_counts()
         
         # Pre-translate common terms
         print("Pre-translating common terms for consistency...")
-        for term, count in sorted(term_counts.items(), key=lambda x: x[1], reverse=True):
-            if count >= 2 and term not in self.consistent_terms and term not in self.session_translations:
+        for term, count in term_counts[term_counts >= 2].items():
+            if term not in self.consistent_terms and term not in self.session_translations:
                 if term in self.translation_memory:
                     translation = self.translation_memory[term]['target']
                     self.session_translations[term] = translation
@@ -489,8 +582,9 @@ class TranslationSystem:
         start_time = time.time()
         for idx in range(len(df)):
             try:
-                zh_text = str(df.iloc[idx, 1]).strip() if pd.notna(df.iloc[idx, 1]) else ""
-                en_text = str(df.iloc[idx, 2]).strip() if pd.notna(df.iloc[idx, 2]) else ""
+                zh_text = source['zh_text'].iat[idx]
+                en_text = source['en_text'].iat[idx]
+                self.ledger.set_context(sheet=os.path.basename(self.input_file), row=idx)
                 
                 # Skip if we already have a translation
                 if pd.notna(df.iloc[idx, 12]) and df.iloc[idx, 12]:
@@ -521,6 +615,7 @@ class TranslationSystem:
                     
                     # Save the training data buffer
                     self.save_training_data_buffer()
+                    print(f"Prompt cache hit rate so far: {self.ledger.cache_hit_rate:.1%}")
                     
                     # Update the term base and save assets
                     if localized_count % (self.save_interval * 5) == 0:
@@ -538,6 +633,7 @@ class TranslationSystem:
         df.to_excel(self.output_file, index=False)
         self.save_training_data_buffer()
         print("Translation complete. Output saved to:", self.output_file)
+        self.ledger.print_report()
         
     def save_assets(self, output_dir: str) -> None:
         """Save translation memory and term base to files"""
@@ -616,27 +712,29 @@ class TranslationSystem:
             print(f"Loaded term base with {len(self.term_base)} entries")
             print(f"Loaded consistency dictionary with {len(self.consistent_terms)} entries")
             print(f"Loaded session translations with {len(self.session_translations)} entries")
+            self._prompt_prefix = None
         except Exception as e:
             print(f"Error loading assets: {str(e)}")
             print("Building assets from training data instead...")
             self.build_translation_assets()
 
-# Usage
-api_key = "SECRET"
-translator = TranslationSystem(
-    api_key=api_key, 
-    training_file="training_data.xlsx", 
-    input_file="1st_th-en_new_append_0226.xlsx", 
-    output_file="1st_th_new_append_0226_output_fix_v4.xlsx",
-    save_interval=100  # Save every 100 rows
-)
+if __name__ == "__main__":
+    # Usage
+    api_key = "SECRET"
+    translator = TranslationSystem(
+        api_key=api_key, 
+        training_file="training_data.xlsx", 
+        input_file="1st_th-en_new_append_0226.xlsx", 
+        output_file="1st_th_new_append_0226_output_fix_v4.xlsx",
+        save_interval=100  # Save every 100 rows
+    )
 
-# Either load existing assets or build from training data
-try:
-    translator.load_assets("translation_assets")
-except:
-    translator.build_translation_assets()
-    # Save assets for future use
-    translator.save_assets("translation_assets")
+    # Either load existing assets or build from training data
+    try:
+        translator.load_assets("translation_assets")
+    except:
+        translator.build_translation_assets()
+        # Save assets for future use
+        translator.save_assets("translation_assets")
 
-translator.process_translation()
\ No newline at end of file
+    translator.process_translation()
\ No newline at end of file
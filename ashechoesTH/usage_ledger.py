@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+import pandas as pd
+
+# USD per 1M tokens: (prompt, cached prompt, completion). Local backends are free.
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'claude-3-haiku-20240307': (0.25, 0.03, 1.25),
+    'claude-3-5-sonnet-20241022': (3.00, 0.30, 15.00),
+}
+
+def model_prices(model: str) -> tuple:
+    """
+    Prices of a model, matching the longest PRICES key it starts with: responses report dated ids
+    such as gpt-4o-mini-2024-07-18. Unknown models cost nothing.
+    """
+    matches = [name for name in PRICES if str(model).startswith(name)]
+    return PRICES[max(matches, key=len)] if matches else (0.0, 0.0, 0.0)
+
+class UsageLedger:
+    def __init__(self, path: str = 'usage_ledger.jsonl', label: str = ''):
+        """
+        Persisted token ledger: one JSON line per API call, tagged with run, label (script version),
+        backend, model, sheet and row so usage can be aggregated at any of those levels.
+        """
+        self.path = path
+        self.label = label
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._context = threading.local()
+        self.prompt_tokens = 0  # Running totals of this run, for progress logs
+        self.cached_tokens = 0
+
+    def set_context(self, sheet: Optional[str] = None, row: Optional[int] = None) -> None:
+        """Set the sheet/row the calling thread is working on, so helpers can record without passing them"""
+        self._context.sheet = sheet
+        self._context.row = row
+
+    def record(self, backend: str, model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> None:
+        """Append one call to the ledger file"""
+        entry = {
+            'run_id': self.run_id,
+            'label': self.label,
+            'timestamp': time.time(),
+            'backend': backend,
+            'model': model,
+            'sheet': getattr(self._context, 'sheet', None),
+            'row': getattr(self._context, 'row', None),
+            'prompt_tokens': int(prompt_tokens or 0),
+            'cached_tokens': int(cached_tokens or 0),
+            'completion_tokens': int(completion_tokens or 0),
+        }
+        with self._lock:
+            self.prompt_tokens += entry['prompt_tokens']
+            self.cached_tokens += entry['cached_tokens']
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of this run's prompt tokens served from the provider's prompt cache"""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def record_openai(self, response) -> None:
+        """Record the usage block of an OpenAI chat completion"""
+        usage = response.usage
+        if usage is None:
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = getattr(details, 'cached_tokens', 0) if details else 0
+        self.record('openai', response.model, usage.prompt_tokens, usage.completion_tokens, cached)
+
+    def record_anthropic(self, response) -> None:
+        """Record the usage block of an Anthropic message; input_tokens excludes cache reads and writes"""
+        usage = response.usage
+        cached = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        created = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        self.record('anthropic', response.model, usage.input_tokens + cached + created, usage.output_tokens, cached)
+
+    def record_ollama(self, model: str, response_json: dict) -> None:
+        """Record the prompt/eval counts of an Ollama /api/generate response"""
+        self.record('ollama', model, response_json.get('prompt_eval_count', 0), response_json.get('eval_count', 0))
+
+    def load(self) -> pd.DataFrame:
+        """Load every recorded call, across all runs"""
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+        return pd.read_json(self.path, lines=True)
+
+    def summary(self, run_id: Optional[str] = None, by=('label', 'backend', 'sheet')) -> pd.DataFrame:
+        """
+        Aggregate tokens and cost per label/backend/sheet (or any other grouping).
+        Pass run_id='all' to compare runs, e.g. to spot regressions between script versions.
+        """
+        df = self.load()
+        if df.empty:
+            return df
+        if run_id != 'all':
+            df = df[df['run_id'] == (run_id or self.run_id)]
+
+        prices = df['model'].map(model_prices)
+        sheet = df['sheet'].fillna('').astype(str)
+        df = df.assign(
+            sheet=sheet,
+            total_tokens=df['prompt_tokens'] + df['completion_tokens'],
+            cost_usd=(
+                (df['prompt_tokens'] - df['cached_tokens']) * prices.str[0]
+                + df['cached_tokens'] * prices.str[1]
+                + df['completion_tokens'] * prices.str[2]
+            ) / 1_000_000,
+            # Calls made outside any row (e.g. setup) do not count as rows
+            row_key=(sheet + ':' + df['row'].astype(str)).where(df['row'].notna()),
+        )
+
+        summary = df.groupby(list(by)).agg(
+            calls=('model', 'size'),
+            rows=('row_key', 'nunique'),
+            prompt_tokens=('prompt_tokens', 'sum'),
+            cached_tokens=('cached_tokens', 'sum'),
+            completion_tokens=('completion_tokens', 'sum'),
+            total_tokens=('total_tokens', 'sum'),
+            cost_usd=('cost_usd', 'sum'),
+        )
+        summary['cache_hit_rate'] = summary['cached_tokens'] / summary['prompt_tokens'].where(summary['prompt_tokens'] > 0)
+        rows = summary['rows'].where(summary['rows'] > 0)
+        summary['tokens_per_row'] = summary['total_tokens'] / rows
+        summary['cost_per_1k_rows'] = summary['cost_usd'] / rows * 1000
+        return summary
+
+    def print_report(self, run_id: Optional[str] = None) -> None:
+        """Print the usage summary of a run (default: the current one)"""
+        summary = self.summary(run_id)
+        if summary.empty:
+            print("No token usage recorded")
+            return
+        print("Token usage report:")
+        print(summary.to_string(float_format=lambda x: f"{x:.4f}"))